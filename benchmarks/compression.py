@@ -0,0 +1,46 @@
+"""Measure the compression ratio and time of `GET /meters` pages.
+
+Usage: python -m benchmarks.compression [--limit 100]
+"""
+
+import argparse
+import json
+import time
+
+from metr.responses import COMPRESSORS
+from tests.factories import generate_meters
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    body = json.dumps(
+        {"meters": [meter.to_dict() for meter in generate_meters(args.limit)]}
+    ).encode()
+
+    results = []
+    for encoding, compress in COMPRESSORS.items():
+        for level in (1, 6, 9):
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                compressed = compress(body, level)
+            elapsed = (time.perf_counter() - started) / args.repeat
+            results.append(
+                {
+                    "encoding": encoding,
+                    "level": level,
+                    "bytes_in": len(body),
+                    "bytes_out": len(compressed),
+                    "ratio": round(len(body) / len(compressed), 2),
+                    "ms": round(elapsed * 1000, 3),
+                }
+            )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Load test a running `metr.devserver` and report throughput and tail latency.
+
+Usage: python -m benchmarks.loadgen [--url http://127.0.0.1:8000]
+    [--concurrency 8] [--requests 5000] [--meters 10000] [--seed]
+"""
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from collections import Counter
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+from benchmarks.suite import percentile
+
+Request = tuple[str, str, Optional[str]]
+
+
+def meter_body(meter_id: int) -> str:
+    return json.dumps(
+        {
+            "meter_id": meter_id,
+            "external_reference": f"LOAD-{meter_id}",
+            "supply_start_date": "2024-01-01",
+            "supply_end_date": None,
+            "enabled": True,
+            "annual_quantity": 1000.0,
+        }
+    )
+
+
+def get_meter(meters: int) -> Request:
+    return "GET", f"/meters/{random.randrange(meters)}", None
+
+
+def list_meters(meters: int) -> Request:
+    return "GET", "/meters?limit=20&count=estimate&enabled=true", None
+
+
+def patch_meter(meters: int) -> Request:
+    body = json.dumps({"annual_quantity": random.randint(1, 100_000)})
+    return "PATCH", f"/meters/{random.randrange(meters)}", body
+
+
+# Mostly reads, with some writes to bring out database locking
+SCENARIO_WEIGHTS: dict[Callable[[int], Request], int] = {
+    get_meter: 6,
+    list_meters: 3,
+    patch_meter: 1,
+}
+
+
+def seed(url: str, meters: int) -> None:
+    host = urlsplit(url).netloc
+    connection = http.client.HTTPConnection(host)
+    for start in range(0, meters, 1_000):
+        body = "[" + ",".join(map(meter_body, range(start, min(start + 1_000, meters))))
+        connection.request("POST", "/meters", body + "]")
+        connection.getresponse().read()
+    connection.close()
+
+
+def worker(
+    host: str, meters: int, count: int, timings: list[float], statuses: Counter
+) -> None:
+    scenarios = list(SCENARIO_WEIGHTS)
+    weights = list(SCENARIO_WEIGHTS.values())
+    connection = http.client.HTTPConnection(host)
+    for _ in range(count):
+        method, path, body = random.choices(scenarios, weights)[0](meters)
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection(host)
+            status = 0
+        timings.append(time.perf_counter() - started)
+        statuses[status] += 1
+    connection.close()
+
+
+def run(url: str, concurrency: int, requests: int, meters: int) -> dict:
+    host = urlsplit(url).netloc
+    timings: list[float] = []
+    statuses: Counter = Counter()
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(host, meters, requests // concurrency, timings, statuses),
+        )
+        for _ in range(concurrency)
+    ]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(timings),
+        "rps": round(len(timings) / elapsed, 1),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--meters", type=int, default=10_000)
+    parser.add_argument(
+        "--seed", action="store_true", help="create the meters before the run"
+    )
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.url, args.meters)
+    print(json.dumps(run(args.url, args.concurrency, args.requests, args.meters)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare the ORM and Core read paths of `GET /meters`.
+
+Usage: python -m benchmarks.read_path [--meters 10000] [--limit 1000]
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Callable
+
+from sqlalchemy import insert
+
+from metr import api, database
+from metr.models import Meter
+from tests.factories import generate_api_gateway_proxy_event_v2, generate_meters
+
+
+def orm_page(limit: int) -> str:
+    # The read path `get_meters` used before the Core fast path
+    session = database.Session()
+    try:
+        rows = session.query(Meter).order_by(Meter.meter_id).limit(limit + 1).all()
+        meters = [row.to_dict() for row in rows[:limit]]
+        return json.dumps({"meters": meters})
+    finally:
+        session.close()
+
+
+def core_page(limit: int) -> str:
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string=f"limit={limit}&count=none"
+    )
+    return api.get_meters(event, None)["body"]  # type: ignore[arg-type]
+
+
+def measure(run: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--meters", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = database.configure_database("sqlite://")
+    database.Base.metadata.create_all(bind=engine)
+    with database.Session.begin() as session:
+        session.execute(
+            insert(Meter),
+            [
+                {column: getattr(meter, column) for column in api.METER_FIELDS}
+                for meter in generate_meters(args.meters)
+            ],
+        )
+
+    orm = measure(lambda: orm_page(args.limit), args.repeat)
+    core = measure(lambda: core_page(args.limit), args.repeat)
+    print(
+        json.dumps(
+            {
+                "limit": args.limit,
+                "orm_ms": round(orm * 1000, 3),
+                "core_ms": round(core * 1000, 3),
+                "speedup": round(orm / core, 2),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Measure the cold start of the API in fresh interpreters.
+
+Usage: python -m benchmarks.startup [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Timed in a fresh interpreter, as a Lambda container would run it
+STARTUP_SCRIPT = """
+import json
+import time
+
+started = time.perf_counter()
+from metr import api, database
+imported = time.perf_counter()
+
+database.Base.metadata.create_all(bind=database.init_database())
+from tests.factories import generate_api_gateway_proxy_event_v2
+
+warm_up_started = time.perf_counter()
+api.warm_up()
+warmed_up = time.perf_counter()
+
+timings = []
+for meter_id in ("1", "2"):
+    event = generate_api_gateway_proxy_event_v2("GET", f"/meters/{meter_id}")
+    request_started = time.perf_counter()
+    api.handler(event, None)
+    timings.append(time.perf_counter() - request_started)
+
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "warm_up_ms": (warmed_up - warm_up_started) * 1000,
+    "first_request_ms": timings[0] * 1000,
+    "warm_request_ms": timings[1] * 1000,
+}))
+"""
+
+
+def measure_startup() -> dict:
+    """Timings of one cold start, plus the wall time of the whole process."""
+    # Warm-up is run explicitly, not on import
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key != "AWS_LAMBDA_FUNCTION_NAME"
+    }
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=Path(__file__).parents[1],
+    ).stdout
+    timings = json.loads(output)
+    timings["process_ms"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [measure_startup() for _ in range(args.repeat)]
+    print(
+        json.dumps(
+            {
+                key: round(statistics.median(run[key] for run in runs), 3)
+                for key in runs[0]
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Benchmark every handler of `metr.api` on large synthetic datasets.
+
+Usage: python -m benchmarks.suite [--sizes 10000,100000,1000000] [--requests 200]
+    [--output results.json] [--baseline baseline.json --tolerance 0.2]
+
+Prints the throughput and latency percentiles of each scenario as JSON, and exits
+with status 1 if a scenario regressed against the baseline by more than the
+tolerance.
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from typing import Callable, Optional
+
+from aws_lambda_typing.context import Context
+from aws_lambda_typing.events import APIGatewayProxyEventV2
+from aws_lambda_typing.responses import APIGatewayProxyResponseV2
+from sqlalchemy import insert
+
+from metr import api, database
+from metr.models import Meter
+from tests.factories import generate_api_gateway_proxy_event_v2, generate_meters
+
+Handler = Callable[[APIGatewayProxyEventV2, Context], APIGatewayProxyResponseV2]
+Scenario = Callable[[int, int], tuple[Handler, APIGatewayProxyEventV2]]
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+SEED_CHUNK_SIZE = 10_000
+
+
+class BenchContext(Context):
+    @staticmethod
+    def get_remaining_time_in_millis() -> int:
+        return 5_000
+
+
+def seed(size: int) -> None:
+    """Replace the meters with `size` generated ones, inserted in chunks."""
+    engine = database.init_database()
+    database.Base.metadata.drop_all(bind=engine)
+    database.Base.metadata.create_all(bind=engine)
+    for start in range(0, size, SEED_CHUNK_SIZE):
+        meters = generate_meters(min(SEED_CHUNK_SIZE, size - start), start)
+        with database.Session.begin() as session:
+            session.execute(
+                insert(Meter),
+                [
+                    {field: getattr(meter, field) for field in api.METER_FIELDS}
+                    for meter in meters
+                ],
+            )
+    api.count_cache.clear()
+    api.meter_cache.clear()
+
+
+def meter_body(meter_id: int) -> str:
+    return json.dumps(
+        {
+            "meter_id": meter_id,
+            "external_reference": f"BENCH-{meter_id}",
+            "supply_start_date": "2024-01-01",
+            "supply_end_date": "2025-01-01",
+            "enabled": True,
+            "annual_quantity": 1234.5,
+        }
+    )
+
+
+def meter_path(meter_id: int) -> tuple[str, dict[str, str]]:
+    return f"/meters/{meter_id}", {"meter_id": str(meter_id)}
+
+
+# Each scenario builds the `i`th request against a dataset of `size` meters. Meters
+# created by `post` are the ones removed by `delete`, so the dataset size holds.
+def list_meters(i: int, size: int):
+    return api.get_meters, generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="limit=50"
+    )
+
+
+def list_filtered(i: int, size: int):
+    return api.get_meters, generate_api_gateway_proxy_event_v2(
+        "GET",
+        "/meters",
+        query_string="limit=50&enabled=true&annual_quantity[gte]=50000",
+    )
+
+
+def list_page(i: int, size: int):
+    cursor = api.encode_cursor(random.randrange(size))
+    return api.get_meters, generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string=f"limit=50&count=none&cursor={cursor}"
+    )
+
+
+def changes(i: int, size: int):
+    return api.get_meter_changes, generate_api_gateway_proxy_event_v2(
+        "GET", "/meters/changes", query_string="limit=100"
+    )
+
+
+def get(i: int, size: int):
+    path, params = meter_path(random.randrange(size))
+    return api.get_meter, generate_api_gateway_proxy_event_v2("GET", path, params)
+
+
+def post(i: int, size: int):
+    return api.post_meters, generate_api_gateway_proxy_event_v2(
+        "POST", "/meters", body=meter_body(size + i)
+    )
+
+
+def put(i: int, size: int):
+    meter_id = random.randrange(size)
+    path, params = meter_path(meter_id)
+    return api.put_meter, generate_api_gateway_proxy_event_v2(
+        "PUT", path, params, body=meter_body(meter_id)
+    )
+
+
+def patch(i: int, size: int):
+    path, params = meter_path(random.randrange(size))
+    return api.patch_meter, generate_api_gateway_proxy_event_v2(
+        "PATCH", path, params, body=json.dumps({"enabled": i % 2 == 0})
+    )
+
+
+def delete(i: int, size: int):
+    path, params = meter_path(size + i)
+    return api.delete_meter, generate_api_gateway_proxy_event_v2("DELETE", path, params)
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "list": list_meters,
+    "list_filtered": list_filtered,
+    "list_page": list_page,
+    "changes": changes,
+    "get": get,
+    "post": post,
+    "put": put,
+    "patch": patch,
+    "delete": delete,
+}
+
+
+def percentile(timings: list[float], q: float) -> float:
+    """Nearest-rank percentile of the timings."""
+    ordered = sorted(timings)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def run_scenario(scenario: Scenario, size: int, requests: int) -> dict:
+    context = BenchContext()
+    timings = []
+    for i in range(requests):
+        handler, event = scenario(i, size)
+        started = time.perf_counter()
+        response = handler(event, context)
+        timings.append(time.perf_counter() - started)
+        if response["statusCode"] >= 400:
+            raise RuntimeError(f"{handler.__name__} failed: {response['body']}")
+
+    return {
+        "requests": requests,
+        "rps": round(requests / sum(timings), 1),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+    }
+
+
+def run(sizes: list[int], requests: int) -> dict:
+    results: dict[str, dict] = {}
+    for size in sizes:
+        seed(size)
+        results[str(size)] = {
+            name: run_scenario(scenario, size, requests)
+            for name, scenario in SCENARIOS.items()
+        }
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Describe the scenarios slower than the baseline by more than `tolerance`."""
+    regressions = []
+    for size, scenarios in results.items():
+        for name, result in scenarios.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            if result["rps"] < base["rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{name} on {size} meters: {result['rps']} requests/sec, "
+                    f"baseline {base['rps']}"
+                )
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                if result[key] > base[key] * (1 + tolerance):
+                    regressions.append(
+                        f"{name} on {size} meters: {key} {result[key]}, "
+                        f"baseline {base[key]}"
+                    )
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="dataset sizes"
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--database-url", default="sqlite://")
+    parser.add_argument("--output", help="file receiving the results")
+    parser.add_argument("--baseline", help="results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    database.configure_database(args.database_url)
+    results = run([int(size) for size in args.sizes.split(",")], args.requests)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
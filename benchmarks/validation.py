@@ -0,0 +1,59 @@
+"""Compare parsing request bodies with `json.loads` and validating the dict to
+validating the raw JSON body in a single pass.
+
+Usage: python -m benchmarks.validation [--repeat 100000]
+"""
+
+import argparse
+import json
+import timeit
+
+from metr.models import MeterInput, MeterInputPatch
+
+BODY = json.dumps(
+    {
+        "meter_id": 1,
+        "external_reference": "REF-000001",
+        "supply_start_date": "2024-01-01",
+        "supply_end_date": "2025-01-01",
+        "enabled": True,
+        "annual_quantity": 1234.5,
+    }
+)
+PATCH_BODY = json.dumps({"enabled": False, "annual_quantity": 99.5})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=100_000)
+    args = parser.parse_args()
+
+    # The paths of `post_meters`/`put_meter` and `patch_meter` before and after
+    cases = {
+        "meter": (
+            lambda: MeterInput(**json.loads(BODY)).to_row(),
+            lambda: MeterInput.model_validate_json(BODY).to_row(),
+        ),
+        "patch": (
+            lambda: MeterInputPatch(**json.loads(PATCH_BODY)).to_values(),
+            lambda: MeterInputPatch.model_validate_json(PATCH_BODY).to_values(),
+        ),
+    }
+
+    results = []
+    for name, (two_pass, single_pass) in cases.items():
+        before = timeit.timeit(two_pass, number=args.repeat) / args.repeat
+        after = timeit.timeit(single_pass, number=args.repeat) / args.repeat
+        results.append(
+            {
+                "body": name,
+                "loads_then_validate_us": round(before * 1e6, 3),
+                "validate_json_us": round(after * 1e6, 3),
+                "saving_us": round((before - after) * 1e6, 3),
+            }
+        )
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,311 +1,648 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import csv
+import hashlib
 import json
-from datetime import datetime
+import logging
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+from typing import TYPE_CHECKING, Optional, TextIO, cast
+from urllib.parse import unquote, urlencode
 
-from aws_lambda_typing.context import Context
-from aws_lambda_typing.events import APIGatewayProxyEventV2
-from aws_lambda_typing.responses import APIGatewayProxyResponseV2
 from pydantic import ValidationError
+from sqlalchemy import and_, false, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import configure_mappers
 from sqlalchemy.orm.exc import NoResultFound
 
-from metr.database import Session
-from metr.models import Meter, MeterInput, MeterInputPatch, MeterInputQueryParams
-
-
+from metr.cache import CacheBackend, CountCache, LRUCache
+from metr.changes import record_changes
+from metr.database import Session, init_database, read_engine
+from metr.idempotency import idempotent
+from metr.instrumentation import instrumented, phase
+from metr.models import (
+    METER_FIELDS,
+    Meter,
+    MeterChange,
+    MeterInput,
+    MeterInputPatch,
+    MeterInputQueryParams,
+    MeterLookupInput,
+    compile_row_encoder,
+)
+from metr.responses import (
+    build_response,
+    json_response,
+    not_modified_response,
+    uncoded_etag,
+)
+
+# Only needed for type checking, importing every event type slows cold starts down
+if TYPE_CHECKING:
+    from aws_lambda_typing.context import Context
+    from aws_lambda_typing.events import APIGatewayProxyEventV2
+    from aws_lambda_typing.responses import APIGatewayProxyResponseV2
+
+logger = logging.getLogger(__name__)
+
+# Columns selected by the read handlers, in the order of the serialized meters
+METER_COLUMNS = tuple(Meter.__table__.c[field] for field in METER_FIELDS)
+
+COUNT_MODES = ("exact", "estimate", "none")
+EXPORT_FORMATS = ("ndjson", "csv")
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+
+# Batch creation limits: meters per request, rows per INSERT and values per IN
+MAX_BATCH_SIZE = 10_000
+BATCH_CHUNK_SIZE = 1_000
+IN_CHUNK_SIZE = 500
+
+MAX_CHANGES_LIMIT = 1_000
+# Entry of the change feed, the operation being one of `CHANGE_OPERATIONS`
+CHANGE_TEMPLATE = '{"change_id": %d, "meter_id": %d, "operation": "%s", "meter": %s}'
+
+# `total_count` values per filter, reused by `count=estimate` requests
+count_cache = CountCache()
+
+# Serialized bodies of `GET /meters/{meter_id}`, invalidated by the write handlers
+meter_cache: CacheBackend = LRUCache(
+    maxsize=int(os.environ.get("METR_METER_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("METR_METER_CACHE_TTL", 60)),
+)
+
+
+@instrumented
 def get_meters(
     event: APIGatewayProxyEventV2, context: Context
 ) -> APIGatewayProxyResponseV2:
-    header = {"content-type": "application/json"}
-
     try:
-        session = Session()
+        session = Session(bind=read_engine())
         query_params = event.get("queryStringParameters", {})
 
-        # Fetch limit & offset if exists unless set to default
-        limit = int(query_params.get("limit", 10))
-        offset = int(query_params.get("offset", 0))
-
-        # query the Meter table
-        query = session.query(Meter)
-
-        converted_query_params = convert_query_params(query_params)
-
-        query_data = MeterInputQueryParams(**converted_query_params)
-
-        query_data_dict = query_data.model_dump(exclude_unset=True)
-
-        for key, value in query_data_dict.items():
-            if hasattr(Meter, key):
-                column_attr = getattr(Meter, key)
-
-                # Debugging to ensure correct attribute is fetched
-                print(
-                    f"Processing key: {key}, value: {value}, column_attr: {column_attr}"
-                )
-
-                query = query.filter(column_attr == value)
-
-        # Geting total number of records before applying limit/offset
-        total_count = query.count()
-
-        # applying pagination(limit and offset) to query
-        query = query.offset(offset).limit(limit)
-
-        # Fetch all meters from the database
-        rows = query.all()
+        # A list of meter IDs fetches these meters instead of a page
+        if "meter_id" in query_params:
+            lookup = MeterLookupInput.model_validate(
+                {"meter_ids": query_params["meter_id"].split(",")}
+            )
+            return lookup_response(event, session, lookup, query_params.get("fields"))
 
-        # Converting each Meter object to a dictionary using the `to_dict()` method
-        meters = [row.to_dict() for row in rows]
+        # Fetch limit if exists unless set to default
+        limit = int(query_params.get("limit", 10))
+        if limit <= 0:
+            raise ValueError(f"Invalid limit: {limit}")
 
-        # Generating next page link if there are more results
-        next_offset = offset + limit
-        next_link = None
-        if next_offset < total_count:
-            next_link = f"/meters?limit={limit}&offset={next_offset}"
-        response_body = {
-            "total_count": total_count,
-            "limit": limit,
-            "offset": offset,
-            "meters": meters,
-            "next_link": next_link,
+        # `offset` is kept as the legacy pagination path, otherwise pages are
+        # fetched by keyset on `meter_id` starting after the given cursor
+        legacy_offset = "offset" in query_params
+        offset = int(query_params.get("offset", 0))
+        cursor = query_params.get("cursor")
+
+        # Select only the requested fields, plus the meter ID needed for the cursor
+        fields = parse_fields(query_params.get("fields"))
+        columns = meter_columns(fields)
+        if "meter_id" not in fields:
+            columns += (Meter.meter_id,)
+
+        with phase("validation"):
+            converted_query_params = convert_query_params(query_params)
+
+            query_data = MeterInputQueryParams(**converted_query_params)
+
+            query_data_dict = query_data.model_dump(exclude_unset=True)
+
+            filters = build_meter_filters(query_data_dict)
+
+        # Geting total number of records before applying pagination, either
+        # exactly, from the count cache or not at all
+        count_mode = query_params.get("count", "exact")
+        if count_mode not in COUNT_MODES:
+            raise ValueError(f"Invalid count mode: {count_mode}")
+
+        total_count = None
+        if count_mode == "estimate":
+            total_count = count_cache.get(query_data_dict)
+        if count_mode != "none" and total_count is None:
+            total_count = session.execute(
+                select(func.count()).select_from(Meter).where(*filters)
+            ).scalar_one()
+            count_cache.set(query_data_dict, total_count)
+
+        # query plain column tuples of the Meter table, ordered on the primary key
+        # so pages are stable
+        query = select(*columns).where(*filters).order_by(Meter.meter_id)
+
+        # applying pagination to query, fetching one extra row to know whether
+        # there is a next page
+        if legacy_offset:
+            query = query.offset(offset)
+        elif cursor:
+            query = query.where(Meter.meter_id > decode_cursor(cursor))
+        rows = session.execute(query.limit(limit + 1)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        # Serializing each row straight to JSON, skipping ORM objects and dicts
+        with phase("serialization"):
+            encode_row = compile_row_encoder(fields)
+            meters_json = "[" + ", ".join(map(encode_row, rows)) + "]"
+
+        # Generating next page link if there are more results, keeping the filters
+        filter_params = {
+            key: value
+            for key, value in query_params.items()
+            if key not in ("limit", "offset", "cursor", "count")
         }
-
-        # Serializing the list of meters to JSON
-        json_data = json.dumps(response_body)
+        next_link = None
+        if legacy_offset:
+            if has_more:
+                next_link = f"/meters?limit={limit}&offset={offset + limit}"
+            response_body = {
+                "total_count": total_count,
+                "limit": limit,
+                "offset": offset,
+                "meters": None,
+                "next_link": next_link,
+            }
+        else:
+            if has_more:
+                next_params = {
+                    **filter_params,
+                    "limit": limit,
+                    "cursor": encode_cursor(rows[-1].meter_id),
+                }
+                next_link = f"/meters?{urlencode(next_params)}"
+            response_body = {
+                "total_count": total_count,
+                "limit": limit,
+                "cursor": cursor,
+                "meters": None,
+                "next_link": next_link,
+            }
+
+        # Serializing the response with the list of meters to JSON
+        with phase("serialization"):
+            json_data = dumps_with_raw_json(response_body, "meters", meters_json)
+
+        # Returning 304 Not Modified if the client already has this page
+        etag = compute_etag(json_data)
+        if etag_matches(event, etag):
+            return not_modified_response(event, etag, json_data)
 
         # Returning the list of meters with a 200 OK status
-        return APIGatewayProxyResponseV2(statusCode=200, headers=header, body=json_data)
+        return build_response(event, 200, json_data, {"etag": etag})
 
     except ValidationError as ve:
-        return APIGatewayProxyResponseV2(
-            statusCode=400,
-            headers=header,
-            body=json.dumps({"error": f"Invalid query parameters: {str(ve)}"}),
+        return json_response(
+            event, 400, {"error": f"Invalid query parameters: {str(ve)}"}
         )
 
+    # Invalid limit, cursor or count mode
+    except ValueError as ve:
+        return json_response(event, 400, {"error": str(ve)})
+
     # Return a 500 response in case of a database error
     except Exception as e:
         error_message = {"error": str(e)}
-        return APIGatewayProxyResponseV2(
-            statusCode=500, headers=header, body=json.dumps(error_message)
-        )
+        return json_response(event, 500, error_message)
 
     # Closing session properly
     finally:
         session.close()
 
 
+@instrumented
+@idempotent
 def post_meters(
     event: APIGatewayProxyEventV2, context: Context
 ) -> APIGatewayProxyResponseV2:
     session = Session()
-    header = {"content-type": "application/json"}
 
     try:
-        # Parse and validate the request body
-        body = json.loads(event.get("body", ""))
-
-        # Validate input using pydantic
-        MeterInput(**body)
-
-        meter = Meter(
-            meter_id=body["meter_id"],
-            external_reference=body["external_reference"],
-            supply_start_date=datetime.strptime(body["supply_start_date"], "%Y-%m-%d"),
-            supply_end_date=(
-                datetime.strptime(body["supply_end_date"], "%Y-%m-%d")
-                if body.get("supply_end_date")
-                else None
-            ),
-            enabled=body["enabled"],
-            annual_quantity=body["annual_quantity"],
-        )
+        raw_body = event.get("body") or ""
 
-        # Check for duplicate meter ID or external reference
-        if session.query(Meter).filter_by(meter_id=meter.meter_id).first():
-            return APIGatewayProxyResponseV2(
-                statusCode=409,
-                headers=header,
-                body=json.dumps({"error": "Duplicate meter ID"}),
-            )
+        # An array body creates all of its meters in a single transaction
+        if raw_body.lstrip().startswith("["):
+            return post_meters_batch(event, session, json.loads(raw_body))
 
-        if (
-            session.query(Meter)
-            .filter_by(external_reference=meter.external_reference)
-            .first()
-        ):
-            return APIGatewayProxyResponseV2(
-                statusCode=409,
-                headers=header,
-                body=json.dumps({"error": "Duplicate external reference"}),
-            )
+        # Parse and validate the request body in a single pass using pydantic
+        with phase("validation"):
+            values = MeterInput.model_validate_json(raw_body).to_row()
 
-        # Add the new meter to the database
-        session.add(meter)
+        # Add the new meter to the database, duplicates are reported by the
+        # primary key and the unique index on the external reference
+        session.execute(insert(Meter).values(**values))
+        record_changes(session, [values["meter_id"]], "upsert")
         session.commit()
-
-        return APIGatewayProxyResponseV2(
-            statusCode=201,
-            headers=header,
-            body=json.dumps(
-                {
-                    "message": "Meter Details added successfully",
-                    "meter_id": meter.meter_id,
-                }
-            ),
+        count_cache.adjust(+1)
+
+        return json_response(
+            event,
+            201,
+            {
+                "message": "Meter Details added successfully",
+                "meter_id": values["meter_id"],
+            },
         )
 
     # Raise exception if unable to decode event body
     except json.JSONDecodeError:
-        return APIGatewayProxyResponseV2(
-            statusCode=400,
-            headers=header,
-            body=json.dumps({"error": "Invalid JSON format"}),
-        )
+        return json_response(event, 400, {"error": "Invalid JSON format"})
 
     # Raise exception if input is not validated properly,
     # or when input has incorrect data types or if any required field is missing
     except ValidationError as e:
-        return APIGatewayProxyResponseV2(
-            statusCode=400,
-            headers=header,
-            body=json.dumps({"error": "Validation error", "details": e.errors()}),
+        if is_json_invalid(e):
+            return json_response(event, 400, {"error": "Invalid JSON format"})
+        return json_response(
+            event, 400, {"error": "Validation error", "details": validation_details(e)}
         )
 
+    # Return 409 for a duplicate meter ID or external reference
+    except IntegrityError as ie:
+        session.rollback()
+        return integrity_error_response(event, ie)
+
     # Returning error in case of any exception and also rolling back the transaction
     except Exception as e:
         session.rollback()
         error_message = {"error": str(e)}
-        return APIGatewayProxyResponseV2(
-            statusCode=500, headers=header, body=json.dumps(error_message)
+        return json_response(event, 500, error_message)
+
+    finally:
+        session.close()
+
+
+def post_meters_batch(
+    event: APIGatewayProxyEventV2, session, items: list
+) -> APIGatewayProxyResponseV2:
+    if len(items) > MAX_BATCH_SIZE:
+        return json_response(
+            event,
+            400,
+            {"error": f"Batch size exceeds the limit of {MAX_BATCH_SIZE} meters"},
         )
 
+    # Validate every item, keeping a status per item in the request order
+    results: list[dict] = [{} for _ in items]
+    rows = []
+    with phase("validation"):
+        for index, item in enumerate(items):
+            try:
+                rows.append((index, MeterInput.model_validate(item).to_row()))
+            except ValidationError as e:
+                results[index] = {
+                    "status": 400,
+                    "error": "Validation error",
+                    "details": validation_details(e),
+                }
+
+    # Find duplicates against the database with set-based queries and within
+    # the batch itself
+    existing_ids, existing_refs = find_existing_meters(
+        session,
+        [row["meter_id"] for _, row in rows],
+        [row["external_reference"] for _, row in rows],
+    )
+    new_rows = []
+    for index, row in rows:
+        if row["meter_id"] in existing_ids:
+            results[index] = {"status": 409, "error": "Duplicate meter ID"}
+        elif row["external_reference"] in existing_refs:
+            results[index] = {"status": 409, "error": "Duplicate external reference"}
+        else:
+            existing_ids.add(row["meter_id"])
+            existing_refs.add(row["external_reference"])
+            new_rows.append(row)
+            results[index] = {"status": 201, "meter_id": row["meter_id"]}
+
+    # Build the response before committing, so it cannot fail once the meters
+    # are written
+    all_created = len(new_rows) == len(items)
+    response = json_response(
+        event,
+        201 if all_created else 207,
+        {
+            "created": len(new_rows),
+            "failed": len(items) - len(new_rows),
+            "results": [
+                {"index": index, **result} for index, result in enumerate(results)
+            ],
+        },
+    )
+
+    # Insert the new meters with one executemany per chunk
+    for start in range(0, len(new_rows), BATCH_CHUNK_SIZE):
+        session.execute(insert(Meter), new_rows[start : start + BATCH_CHUNK_SIZE])
+    record_changes(session, [row["meter_id"] for row in new_rows], "upsert")
+    session.commit()
+    count_cache.adjust(len(new_rows))
+
+    return response
+
+
+def find_existing_meters(
+    session, meter_ids: list[int], external_references: list[str]
+) -> tuple[set[int], set[str]]:
+    existing_ids: set[int] = set()
+    existing_refs: set[str] = set()
+    for start in range(0, max(len(meter_ids), len(external_references)), IN_CHUNK_SIZE):
+        query = select(Meter.meter_id, Meter.external_reference).where(
+            or_(
+                Meter.meter_id.in_(meter_ids[start : start + IN_CHUNK_SIZE]),
+                Meter.external_reference.in_(
+                    external_references[start : start + IN_CHUNK_SIZE]
+                ),
+            )
+        )
+        for meter_id, external_reference in session.execute(query):
+            existing_ids.add(meter_id)
+            existing_refs.add(external_reference)
+    return existing_ids, existing_refs
+
+
+@instrumented
+def lookup_meters(
+    event: APIGatewayProxyEventV2, context: Context
+) -> APIGatewayProxyResponseV2:
+    session = Session(bind=read_engine())
+
+    try:
+        # Parse and validate the request body
+        lookup = MeterLookupInput.model_validate(json.loads(event.get("body", "")))
+        query_params = event.get("queryStringParameters") or {}
+
+        return lookup_response(event, session, lookup, query_params.get("fields"))
+
+    # Raise exception if unable to decode event body
+    except json.JSONDecodeError:
+        return json_response(event, 400, {"error": "Invalid JSON format"})
+
+    except ValidationError as e:
+        return json_response(
+            event, 400, {"error": "Validation error", "details": validation_details(e)}
+        )
+
+    except InvalidFieldsError as fe:
+        return json_response(event, 400, {"error": str(fe)})
+
+    except Exception as e:
+        error_message = {"error": str(e)}
+        return json_response(event, 500, error_message)
+
+    finally:
+        session.close()
+
+
+# Fetch the meters matching any of the IDs or external references with chunked IN
+# queries, reporting the ones not found
+def lookup_response(
+    event: APIGatewayProxyEventV2,
+    session,
+    lookup: MeterLookupInput,
+    fields: Optional[str],
+) -> APIGatewayProxyResponseV2:
+    selected = parse_fields(fields)
+    columns = meter_columns(selected) + (Meter.meter_id, Meter.external_reference)
+
+    meter_ids = sorted(set(lookup.meter_ids))
+    external_references = sorted(set(lookup.external_references))
+    rows = {}
+    for column, values in (
+        (Meter.meter_id, meter_ids),
+        (Meter.external_reference, external_references),
+    ):
+        for start in range(0, len(values), IN_CHUNK_SIZE):
+            query = select(*columns).where(
+                column.in_(values[start : start + IN_CHUNK_SIZE])
+            )
+            for row in session.execute(query):
+                rows[row[-2]] = row
+
+    found_ids = set(rows)
+    found_refs = {row[-1] for row in rows.values()}
+    with phase("serialization"):
+        encode_row = compile_row_encoder(selected)
+        meters_json = (
+            "[" + ", ".join(encode_row(rows[key]) for key in sorted(rows)) + "]"
+        )
+    response_body = {
+        "meters": None,
+        "missing": {
+            "meter_ids": [
+                meter_id for meter_id in meter_ids if meter_id not in found_ids
+            ],
+            "external_references": [
+                ref for ref in external_references if ref not in found_refs
+            ],
+        },
+    }
+    return build_response(
+        event, 200, dumps_with_raw_json(response_body, "meters", meters_json)
+    )
+
+
+@instrumented
+def get_meter_changes(
+    event: APIGatewayProxyEventV2, context: Context
+) -> APIGatewayProxyResponseV2:
+    session = Session(bind=read_engine())
+
+    try:
+        query_params = event.get("queryStringParameters") or {}
+        limit = int(query_params.get("limit", 100))
+        if not 0 < limit <= MAX_CHANGES_LIMIT:
+            raise ValueError(f"Invalid limit: {limit}")
+        since = query_params.get("since")
+        since_id = decode_cursor(since, "change_id") if since else None
+
+        rows = session.execute(changes_query(since_id, limit + 1)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        with phase("serialization"):
+            encode_row = compile_row_encoder()
+            changes_json = (
+                "[" + ", ".join(encode_change(row, encode_row) for row in rows) + "]"
+            )
+
+        # Clients resume from `next_since`, which stays put when nothing changed
+        next_since = encode_cursor(rows[-1][-3], "change_id") if rows else since
+        next_link = None
+        if has_more:
+            next_link = (
+                f"/meters/changes?{urlencode({'since': next_since, 'limit': limit})}"
+            )
+        response_body = {
+            "changes": None,
+            "since": since,
+            "next_since": next_since,
+            "next_link": next_link,
+        }
+        return build_response(
+            event, 200, dumps_with_raw_json(response_body, "changes", changes_json)
+        )
+
+    # Invalid limit or since token
+    except ValueError as ve:
+        return json_response(event, 400, {"error": str(ve)})
+
+    except Exception as e:
+        error_message = {"error": str(e)}
+        return json_response(event, 500, error_message)
+
     finally:
         session.close()
 
 
+# Page through the changes by keyset on their ID, along with the current state of
+# the changed meters, so the cost follows the number of changes
+def changes_query(since_id: Optional[int], limit: int):
+    query = (
+        select(
+            *METER_COLUMNS,
+            MeterChange.change_id,
+            MeterChange.meter_id,
+            MeterChange.operation,
+        )
+        .select_from(MeterChange)
+        .outerjoin(Meter, Meter.meter_id == MeterChange.meter_id)
+        .order_by(MeterChange.change_id)
+    )
+    if since_id is not None:
+        query = query.where(MeterChange.change_id > since_id)
+    return query.limit(limit)
+
+
+@instrumented
 def get_meter(
     event: APIGatewayProxyEventV2, context: Context
 ) -> APIGatewayProxyResponseV2:
-    session = Session()
-    header = {"content-type": "application/json"}
+    session = Session(bind=read_engine())
 
     try:
         meter_id = event["pathParameters"].get("meter_id")
-        # Query the meter by ID
-        row = session.query(Meter).filter_by(meter_id=meter_id).one()
-        json_data = json.dumps(row.to_dict())
+        query_params = event.get("queryStringParameters") or {}
+        fields = parse_fields(query_params.get("fields"))
+
+        # Serve the meter and its ETag from the cache, or query it by ID and
+        # cache it. Only full meters are cached, sparse ones are always queried.
+        cached = None
+        if fields == METER_FIELDS:
+            cached = meter_cache.get(meter_cache_key(meter_id))
+        if cached is None:
+            columns = meter_columns(fields)
+            if fields == METER_FIELDS:
+                columns += (Meter.created_stamp,)
+            row = session.execute(
+                select(*columns).where(Meter.meter_id == meter_id)
+            ).one()
+            with phase("serialization"):
+                json_data = compile_row_encoder(fields)(row)
+            # Full meters are tagged with their version, which `If-Match` takes
+            if fields == METER_FIELDS:
+                cached = (version_etag(row.version, row.created_stamp), json_data)
+                meter_cache.set(meter_cache_key(meter_id), cached)
+            else:
+                cached = (compute_etag(json_data), json_data)
+        etag, json_data = cached
+
+        # Return 304 Not Modified if the client already has this version
+        if etag_matches(event, etag):
+            return not_modified_response(event, etag, json_data)
 
         # Return 200 OK with the meter data
-        return APIGatewayProxyResponseV2(statusCode=200, headers=header, body=json_data)
+        return build_response(event, 200, json_data, {"etag": etag})
 
     # Return 404(Not Found), if the meter is not found
     except NoResultFound:
-        return APIGatewayProxyResponseV2(
-            statusCode=404,
-            headers=header,
-            body=json.dumps({"error": "Meter not found"}),
-        )
+        return json_response(event, 404, {"error": "Meter not found"})
+
+    # Return 400 if unknown fields are requested
+    except InvalidFieldsError as fe:
+        return json_response(event, 400, {"error": str(fe)})
 
     # Return 500 for any database-related errors
     except Exception as e:
-        return APIGatewayProxyResponseV2(
-            statusCode=500,
-            headers=header,
-            body=json.dumps({"error": "Database error", "details": str(e)}),
-        )
+        return json_response(event, 500, {"error": "Database error", "details": str(e)})
 
     finally:
         session.close()
 
 
+@instrumented
+@idempotent
 def put_meter(
     event: APIGatewayProxyEventV2, context: Context
 ) -> APIGatewayProxyResponseV2:
     session = Session()
-    header = {"content-type": "application/json"}
 
     try:
-        # Parse and validate the request body
-        body = json.loads(event.get("body", ""))
-
-        # Validate body using Pydantic
-        MeterInput(**body)
-
-        meter = Meter(
-            meter_id=body["meter_id"],
-            external_reference=body["external_reference"],
-            supply_start_date=datetime.strptime(body["supply_start_date"], "%Y-%m-%d"),
-            supply_end_date=(
-                datetime.strptime(body["supply_end_date"], "%Y-%m-%d")
-                if body.get("supply_end_date")
-                else None
-            ),
-            enabled=body["enabled"],
-            annual_quantity=body["annual_quantity"],
-        )
-
-        # Try to find the existing meter in the database
-        existing_meter = (
-            session.query(Meter).filter_by(meter_id=meter.meter_id).one_or_none()
-        )
+        # Parse and validate the request body in a single pass using Pydantic
+        with phase("validation"):
+            values = MeterInput.model_validate_json(event.get("body") or "").to_row()
+        meter_id = values.pop("meter_id")
+
+        # Update the meter with a single compare-and-swap statement, no row means
+        # it does not exist or its version does not match `If-Match`
+        conditions = version_conditions(event)
+        updated = session.execute(
+            update(Meter)
+            .where(Meter.meter_id == meter_id, *conditions)
+            .values(**values, version=Meter.version + 1)
+            .returning(Meter.meter_id, Meter.version, Meter.created_stamp)
+            .execution_options(synchronize_session=False)
+        ).one_or_none()
 
         # Check if meter exists or not
-        if not existing_meter:
-            return APIGatewayProxyResponseV2(
-                statusCode=404,
-                headers=header,
-                body=json.dumps(
-                    {"message": f"Could not find the meter with ID: {meter.meter_id}"}
-                ),
-            )
+        if updated is None:
+            return missing_meter_response(event, session, meter_id, conditions)
 
-        # update and commit the changes
-        session.merge(meter)
+        record_changes(session, [meter_id], "upsert")
         session.commit()
-
-        return APIGatewayProxyResponseV2(
-            statusCode=200,
-            headers=header,
-            body=json.dumps(
-                {"message": "Meter updated successfully", "meter_id": meter.meter_id}
-            ),
-        )
-
-    # Raise exception if unable to decode event body
-    except json.JSONDecodeError:
-        return APIGatewayProxyResponseV2(
-            statusCode=400,
-            headers=header,
-            body=json.dumps({"error": "Invalid JSON format"}),
+        count_cache.clear()
+        meter_cache.delete(meter_cache_key(meter_id))
+
+        return json_response(
+            event,
+            200,
+            {"message": "Meter updated successfully", "meter_id": meter_id},
+            {"etag": version_etag(updated.version, updated.created_stamp)},
         )
 
     # Raise exception if input is not validated properly,
     # or when input has incorrect data types or if any required field is missing
     except ValidationError as e:
-        return APIGatewayProxyResponseV2(
-            statusCode=400,
-            headers=header,
-            body=json.dumps({"error": "Validation error", "details": e.errors()}),
+        if is_json_invalid(e):
+            return json_response(event, 400, {"error": "Invalid JSON format"})
+        return json_response(
+            event, 400, {"error": "Validation error", "details": validation_details(e)}
         )
 
+    # Return 409 if the external reference belongs to another meter
+    except IntegrityError as ie:
+        session.rollback()
+        return integrity_error_response(event, ie)
+
     # Returning error in case of any exception and also rolling back the transaction
     except Exception as e:
         session.rollback()
         error_message = {"error": str(e)}
-        return APIGatewayProxyResponseV2(
-            statusCode=500, headers=header, body=json.dumps(error_message)
-        )
+        return json_response(event, 500, error_message)
 
     finally:
         session.close()
 
 
+@instrumented
 def delete_meter(
     event: APIGatewayProxyEventV2, context: Context
 ) -> APIGatewayProxyResponseV2:
     session = Session()
-    header = {"content-type": "application/json"}
     meter_id = event["pathParameters"].get("meter_id")
 
     try:
@@ -314,108 +651,466 @@ def delete_meter(
 
         # Returning 204(not found), if meter details not found by given ID
         if not row:
-            return APIGatewayProxyResponseV2(
-                statusCode=204,
-                headers=header,
-                body=json.dumps(
-                    {"message": f"Could not find the meter with ID: {meter_id}"}
-                ),
+            return json_response(
+                event, 204, {"message": f"Could not find the meter with ID: {meter_id}"}
             )
 
         # Deleting the row if meter id is found
         session.delete(row)
+        record_changes(session, [row.meter_id], "delete")
         session.commit()
-        return APIGatewayProxyResponseV2(
-            statusCode=200,
-            headers=header,
-            body=json.dumps(
-                {"message": "Meter with {meter_id} ID deleted successfully"}
-            ),
+        count_cache.adjust(-1)
+        meter_cache.delete(meter_cache_key(meter_id))
+        return json_response(
+            event, 200, {"message": "Meter with {meter_id} ID deleted successfully"}
         )
 
     # Returning error in case of any exception and also rolling back the transaction
     except Exception as er:
         session.rollback()
         error_message = {"error": str(er)}
-        return APIGatewayProxyResponseV2(
-            statusCode=500, headers=header, body=json.dumps(error_message)
-        )
+        return json_response(event, 500, error_message)
 
     finally:
         session.close()
 
 
 # Patch meter details
+@instrumented
 def patch_meter(
     event: APIGatewayProxyEventV2, context: Context
 ) -> APIGatewayProxyResponseV2:
     session = Session()
-    header = {"content-type": "application/json"}
 
     try:
         meter_id = event["pathParameters"].get("meter_id")
 
-        # Parse and validate the request body
-        body = json.loads(event.get("body", ""))
+        # Parse and validate the request body in a single pass
+        with phase("validation"):
+            meter_input = MeterInputPatch.model_validate_json(event.get("body") or "")
+
+        # Update the fields provided in the request body with a single
+        # compare-and-swap statement, no row means the meter does not exist or its
+        # version does not match `If-Match`
+        conditions = version_conditions(event)
+        values = meter_input.to_values()
+        if values:
+            updated = session.execute(
+                update(Meter)
+                .where(Meter.meter_id == meter_id, *conditions)
+                .values(**values, version=Meter.version + 1)
+                .returning(Meter.meter_id, Meter.version, Meter.created_stamp)
+                .execution_options(synchronize_session=False)
+            ).one_or_none()
+        else:
+            updated = session.execute(
+                select(Meter.meter_id, Meter.version, Meter.created_stamp).where(
+                    Meter.meter_id == meter_id, *conditions
+                )
+            ).one_or_none()
 
-        meter_input = MeterInputPatch(**body)
+        # Check if meter exists or not
+        if updated is None:
+            return missing_meter_response(event, session, meter_id, conditions)
 
-        # Find the existing meter
-        existing_meter = session.query(Meter).filter_by(meter_id=meter_id).one_or_none()
+        # Commit the changes
+        if values:
+            record_changes(session, [updated.meter_id], "upsert")
+        session.commit()
+        count_cache.clear()
+        meter_cache.delete(meter_cache_key(meter_id))
+
+        return json_response(
+            event,
+            200,
+            {"message": "Meter updated successfully", "meter_id": meter_id},
+            {"etag": version_etag(updated.version, updated.created_stamp)},
+        )
 
-        # Check if meter exists or not
-        if not existing_meter:
-            return APIGatewayProxyResponseV2(
-                statusCode=404,
-                headers=header,
-                body=json.dumps(
-                    {"message": f"Could not find the meter with ID: {meter_id}"}
-                ),
+    except ValidationError as ve:
+        # Raise exception if unable to decode event body
+        if is_json_invalid(ve):
+            return json_response(
+                event,
+                400,
+                {"error": f"Invalid JSON format: {ve.errors()[0]['msg']}"},
             )
+        return json_response(event, 400, {"error": f"Invalid data: {str(ve)}"})
 
-        # Update the fields provided in the request body
-        meter_data = meter_input.model_dump(exclude_unset=True)
+    # Return 409 if the external reference belongs to another meter
+    except IntegrityError as ie:
+        session.rollback()
+        return integrity_error_response(event, ie)
 
-        for key, value in meter_data.items():
-            setattr(existing_meter, key, value)
+    except Exception as e:
+        session.rollback()
+        error_message = {"error": str(e)}
+        return json_response(event, 500, error_message)
 
-        # Commit the changes
-        session.merge(existing_meter)
-        session.commit()
+    finally:
+        session.close()
 
-        return APIGatewayProxyResponseV2(
-            statusCode=200,
-            headers=header,
-            body=json.dumps(
-                {"message": "Meter updated successfully", "meter_id": meter_id}
-            ),
-        )
 
-    # Raise exception if unable to decode event body
-    except json.JSONDecodeError as e:
-        return APIGatewayProxyResponseV2(
-            statusCode=400,
-            headers=header,
-            body=json.dumps({"error": f"Invalid JSON format: {e}"}),
+# Routes of the single entry point `handler`, as path templates with the handler of
+# each method
+ROUTES = {
+    "/meters": {"GET": get_meters, "POST": post_meters},
+    "/meters:lookup": {"POST": lookup_meters},
+    "/meters/changes": {"GET": get_meter_changes},
+    "/meters/{meter_id}": {
+        "GET": get_meter,
+        "PUT": put_meter,
+        "PATCH": patch_meter,
+        "DELETE": delete_meter,
+    },
+}
+
+
+def compile_routes(routes: dict) -> tuple[dict, list]:
+    """Split the routes into a lookup table of static paths and path patterns."""
+    static_routes = {}
+    pattern_routes = []
+    for template, methods in routes.items():
+        if "{" not in template:
+            static_routes[template] = methods
+            continue
+        pattern = re.sub(r"\\{(\w+)\\}", r"(?P<\1>[^/]+)", re.escape(template))
+        pattern_routes.append((re.compile(pattern), methods))
+    return static_routes, pattern_routes
+
+
+STATIC_ROUTES, PATTERN_ROUTES = compile_routes(ROUTES)
+
+
+def match_route(path: str) -> Optional[tuple[dict, dict[str, str]]]:
+    """Handlers per method and path parameters of the route matching `path`."""
+    if len(path) > 1:
+        path = path.removesuffix("/")
+    methods = STATIC_ROUTES.get(path)
+    if methods is not None:
+        return methods, {}
+    for pattern, methods in PATTERN_ROUTES:
+        match = pattern.fullmatch(path)
+        if match:
+            return methods, {
+                name: unquote(value) for name, value in match.groupdict().items()
+            }
+    return None
+
+
+# Single entry point dispatching every route, so one warm container serves them
+# all with the same engine and caches
+def handler(
+    event: APIGatewayProxyEventV2, context: Context
+) -> APIGatewayProxyResponseV2:
+    route = match_route(event.get("rawPath", ""))
+    if route is None:
+        return json_response(event, 404, {"error": "Not found"})
+
+    methods, path_params = route
+    method = event["requestContext"]["http"]["method"]
+    target = methods.get(method)
+    if target is None:
+        return json_response(
+            event,
+            405,
+            {"error": f"Method {method} not allowed"},
+            {"allow": ", ".join(methods)},
         )
 
-    except ValidationError as ve:
-        return APIGatewayProxyResponseV2(
-            statusCode=400,
-            headers=header,
-            body=json.dumps({"error": f"Invalid data: {str(ve)}"}),
+    if path_params:
+        event = cast(
+            "APIGatewayProxyEventV2",
+            {
+                **event,
+                "pathParameters": {
+                    **(event.get("pathParameters") or {}),
+                    **path_params,
+                },
+            },
         )
+    return target(event, context)
 
-    except Exception as e:
-        session.rollback()
-        error_message = {"error": str(e)}
-        return APIGatewayProxyResponseV2(
-            statusCode=500, headers=header, body=json.dumps(error_message)
+
+# Export all meters to `out`, streaming rows from the database in chunks so memory
+# stays flat whatever the table size
+def export_meters(out: TextIO, fmt: str = "ndjson", chunk_size: int = 1_000) -> dict:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid export format: {fmt}")
+
+    session = Session(bind=read_engine())
+    started = time.perf_counter()
+    exported = 0
+
+    try:
+        query = (
+            select(*METER_COLUMNS)
+            .order_by(Meter.meter_id)
+            .execution_options(yield_per=chunk_size)
         )
 
+        writer = None
+        if fmt == "csv":
+            writer = csv.writer(out)
+            writer.writerow(METER_FIELDS)
+
+        encode_row = compile_row_encoder()
+        for row in session.execute(query):
+            if writer:
+                writer.writerow(
+                    [
+                        value.isoformat() if isinstance(value, datetime) else value
+                        for value in row
+                    ]
+                )
+            else:
+                out.write(encode_row(row) + "\n")
+            exported += 1
+
     finally:
         session.close()
 
+    elapsed = time.perf_counter() - started
+    stats = {
+        "rows": exported,
+        "seconds": elapsed,
+        "rows_per_sec": exported / elapsed if elapsed else 0.0,
+    }
+    logger.info("Exported %(rows)d meters at %(rows_per_sec).0f rows/sec", stats)
+    return stats
+
+
+# Same as `json.dumps(body)`, the value of `key` being inserted as already
+# serialized JSON
+def dumps_with_raw_json(body: dict, key: str, raw_json: str) -> str:
+    items = (
+        f"{json.dumps(name)}: {raw_json if name == key else json.dumps(value)}"
+        for name, value in body.items()
+    )
+    return "{" + ", ".join(items) + "}"
+
+
+def encode_change(row, encode_row) -> str:
+    """Serialize a change feed row, deleted meters being tombstones without a meter."""
+    change_id, meter_id, operation = row[-3:]
+    meter_json = encode_row(row) if row[0] is not None else "null"
+    return CHANGE_TEMPLATE % (change_id, meter_id, operation, meter_json)
+
+
+# Strong ETag of a response body
+def compute_etag(body: str) -> str:
+    return f'"{hashlib.blake2b(body.encode(), digest_size=16).hexdigest()}"'
+
+
+# Whether the `If-None-Match` header of the request matches the ETag, using the
+# weak comparison required for conditional GETs
+def etag_matches(event: APIGatewayProxyEventV2, etag: str) -> bool:
+    if_none_match = (event.get("headers") or {}).get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (
+        uncoded_etag(tag.strip().removeprefix("W/")) for tag in if_none_match.split(",")
+    )
+
+
+# ETag of a full meter, its version along with its creation stamp
+def version_etag(version: int, created_stamp: int) -> str:
+    return f'"{version}.{created_stamp:x}"'
+
+
+def if_match_versions(
+    event: APIGatewayProxyEventV2,
+) -> Optional[list[tuple[int, int]]]:
+    """Versions and creation stamps listed by the `If-Match` header, `None` if any
+    version matches.
+
+    Only strong version ETags can match, as `If-Match` uses the strong comparison.
+    """
+    if_match = (event.get("headers") or {}).get("if-match")
+    if if_match is None or if_match.strip() == "*":
+        return None
+
+    versions = []
+    for tag in if_match.split(","):
+        tag = uncoded_etag(tag.strip())
+        if len(tag) < 2 or tag[0] != '"' or tag[-1] != '"':
+            continue
+        version, _, created_stamp = tag[1:-1].partition(".")
+        try:
+            versions.append((int(version), int(created_stamp, 16)))
+        except ValueError:
+            continue
+    return versions
+
+
+def version_conditions(event: APIGatewayProxyEventV2) -> list:
+    """Conditions of a compare-and-swap update honouring the `If-Match` header."""
+    versions = if_match_versions(event)
+    if versions is None:
+        return []
+    if not versions:
+        return [false()]
+    return [
+        or_(
+            *(
+                and_(Meter.version == version, Meter.created_stamp == created_stamp)
+                for version, created_stamp in versions
+            )
+        )
+    ]
+
+
+def missing_meter_response(
+    event: APIGatewayProxyEventV2, session, meter_id, conditions: list
+) -> APIGatewayProxyResponseV2:
+    """404 if the meter of a failed update does not exist, 412 if it was changed."""
+    current = None
+    if conditions:
+        current = session.execute(
+            select(Meter.version, Meter.created_stamp).where(Meter.meter_id == meter_id)
+        ).one_or_none()
+    session.rollback()
+
+    if current is not None:
+        return json_response(
+            event,
+            412,
+            {"error": "Meter was modified", "version": current.version},
+            {"etag": version_etag(current.version, current.created_stamp)},
+        )
+    return json_response(
+        event, 404, {"message": f"Could not find the meter with ID: {meter_id}"}
+    )
+
+
+# Unique constraint violations are client errors, reported as duplicate meter IDs
+# or external references
+def integrity_error_response(
+    event: APIGatewayProxyEventV2, error: IntegrityError
+) -> APIGatewayProxyResponseV2:
+    message = str(error.orig).lower()
+    if "unique" not in message and "duplicate" not in message:
+        return json_response(event, 500, {"error": str(error)})
+    if "external_reference" in message:
+        return json_response(event, 409, {"error": "Duplicate external reference"})
+    return json_response(event, 409, {"error": "Duplicate meter ID"})
+
+
+# Error details with their context made JSON serializable, e.g. the `Decimal` limit
+# of `annual_quantity`
+def validation_details(error: ValidationError) -> list:
+    return json.loads(error.json(include_url=False))
+
+
+def is_json_invalid(error: ValidationError) -> bool:
+    """Whether validating a raw JSON body failed on the JSON syntax."""
+    return any(detail["type"] == "json_invalid" for detail in error.errors())
+
+
+# Path parameters are strings, so IDs are normalized to match the integer IDs of
+# the request bodies
+def meter_cache_key(meter_id) -> str:
+    try:
+        return str(int(meter_id))
+    except (TypeError, ValueError):
+        return str(meter_id)
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+class InvalidFieldsError(ValueError):
+    pass
+
+
+# Validate the comma separated `fields` parameter, keeping the order of the
+# serialized meters
+def parse_fields(fields: Optional[str]) -> tuple[str, ...]:
+    if fields is None:
+        return METER_FIELDS
+
+    requested = {field.strip() for field in fields.split(",")}
+    unknown = requested.difference(METER_FIELDS)
+    if unknown:
+        raise InvalidFieldsError(f"Invalid fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in METER_FIELDS if field in requested)
+
+
+def meter_columns(fields: tuple[str, ...]) -> tuple:
+    return tuple(Meter.__table__.c[field] for field in fields)
+
+
+# Cursors are opaque to clients, they only hand back what `next_link` contains
+def encode_cursor(value: int, key: str = "meter_id") -> str:
+    payload = json.dumps({key: value}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key: str = "meter_id") -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        return int(payload[key])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursorError(f"Invalid cursor: {cursor}")
+
+
+# Translate the validated query parameters to SQL conditions which can use the
+# indexes of the filtered columns
+def build_meter_filters(query_data: dict) -> list:
+    filters = []
+    for key, value in query_data.items():
+        logger.debug("Building filter for %s=%s", key, value)
+
+        if key == "active_on":
+            day, next_day = day_bounds(value)
+            filters.append(Meter.supply_start_date < next_day)
+            filters.append(
+                or_(Meter.supply_end_date.is_(None), Meter.supply_end_date >= day)
+            )
+            continue
+
+        name, _, operator = key.rpartition("_")
+        if operator in RANGE_OPERATORS and hasattr(Meter, name):
+            filters.append(range_filter(getattr(Meter, name), operator, value))
+        elif isinstance(value, date) and hasattr(Meter, key):
+            day, next_day = day_bounds(value)
+            filters.append(getattr(Meter, key) >= day)
+            filters.append(getattr(Meter, key) < next_day)
+        elif hasattr(Meter, key):
+            filters.append(getattr(Meter, key) == value)
+
+    return filters
+
+
+# Dates are compared to the datetime columns through the bounds of the day, so that
+# e.g. `lte` includes the whole day, like equality does
+def range_filter(column, operator: str, value):
+    if isinstance(value, date):
+        day, next_day = day_bounds(value)
+        return {
+            "gt": column >= next_day,
+            "gte": column >= day,
+            "lt": column < day,
+            "lte": column < next_day,
+        }[operator]
+
+    value = float(value)
+    return {
+        "gt": column > value,
+        "gte": column >= value,
+        "lt": column < value,
+        "lte": column <= value,
+    }[operator]
+
+
+def day_bounds(day: date) -> tuple[datetime, datetime]:
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
 
 def convert_query_params(params):
     converted = {}
@@ -438,3 +1133,28 @@ def convert_query_params(params):
             converted[key] = value
 
     return converted
+
+
+def warm_up() -> None:
+    """Pay the one-off costs of the first request during the Lambda init phase.
+
+    Configures the mappers, builds the row encoder, and opens a pooled connection,
+    compiling the statement of `GET /meters/{meter_id}`. The pydantic validators
+    are already built when their models are defined.
+    """
+    started = time.perf_counter()
+    configure_mappers()
+    compile_row_encoder()
+
+    try:
+        with init_database().connect() as connection:
+            connection.execute(select(*METER_COLUMNS).where(Meter.meter_id == -1)).all()
+    except Exception:
+        logger.warning("Could not connect to the database on warm-up", exc_info=True)
+
+    logger.info("Warmed up in %.1f ms", (time.perf_counter() - started) * 1000)
+
+
+# Lambda runs the module import during the init phase of its containers
+if "AWS_LAMBDA_FUNCTION_NAME" in os.environ:
+    warm_up()
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Protocol
+
+
+class CacheBackend(Protocol):
+    """Interface of the caches, so a shared cache can replace the in-process one."""
+
+    def get(self, key: Hashable) -> Optional[Any]: ...
+
+    def set(self, key: Hashable, value: Any) -> None: ...
+
+    def delete(self, key: Hashable) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def stats(self) -> dict[str, int]: ...
+
+
+class LRUCache:
+    """In-process LRU cache whose entries expire after `ttl` seconds.
+
+    Safe to share between threads, e.g. the workers of the local server.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CountCache:
+    """Cached `total_count` values of `GET /meters`, keyed by the applied filters.
+
+    Writes keep the unfiltered count up to date and drop the filtered ones,
+    since we cannot tell cheaply which filters a created or deleted meter matches.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        # So concurrent writes do not lose each other's adjustment
+        self._adjust_lock = threading.Lock()
+
+    @staticmethod
+    def key(filters: dict[str, Any]) -> Hashable:
+        return tuple(sorted((name, str(value)) for name, value in filters.items()))
+
+    def get(self, filters: dict[str, Any]) -> Optional[int]:
+        return self._cache.get(self.key(filters))
+
+    def set(self, filters: dict[str, Any], count: int) -> None:
+        self._cache.set(self.key(filters), count)
+
+    def adjust(self, delta: int) -> None:
+        with self._adjust_lock:
+            unfiltered = self.get({})
+            self.clear()
+            if unfiltered is not None:
+                self.set({}, max(unfiltered + delta, 0))
+
+    def clear(self) -> None:
+        self._cache.clear()
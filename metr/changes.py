@@ -0,0 +1,33 @@
+from typing import Iterable
+
+from sqlalchemy import delete, func, insert, select
+
+from metr.models import MeterChange
+
+# Meter IDs per statement
+CHUNK_SIZE = 500
+
+# Key of the PostgreSQL advisory lock taken by the transactions recording changes
+CHANGES_LOCK_KEY = 0x6D657472
+
+
+def record_changes(session, meter_ids: Iterable[int], operation: str) -> None:
+    """Record the latest change of the meters, in the caller's transaction.
+
+    Meant to run right before the commit. Change IDs must become visible in order,
+    or a reader could move past the ID of a change committed later and miss it.
+    SQLite only has one writer at a time, on PostgreSQL the transaction holds a
+    lock from here until it commits.
+    """
+    meter_ids = list(meter_ids)
+    if not meter_ids:
+        return
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(select(func.pg_advisory_xact_lock(CHANGES_LOCK_KEY)))
+    for start in range(0, len(meter_ids), CHUNK_SIZE):
+        chunk = meter_ids[start : start + CHUNK_SIZE]
+        session.execute(delete(MeterChange).where(MeterChange.meter_id.in_(chunk)))
+        session.execute(
+            insert(MeterChange),
+            [{"meter_id": meter_id, "operation": operation} for meter_id in chunk],
+        )
@@ -1,10 +1,211 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+import itertools
+import os
+import time
+from typing import Any, Callable, Optional
+
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session as OrmSession, declarative_base, sessionmaker
 
 Base = declarative_base()
-Session = sessionmaker()
 
+DEFAULT_DATABASE_URL = "sqlite://"
+
+
+def _parse_bool(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+# Pool settings which can be tuned through the environment
+POOL_SETTINGS_ENV: dict[str, tuple[str, Callable[[str], Any]]] = {
+    "pool_size": ("METR_DB_POOL_SIZE", int),
+    "max_overflow": ("METR_DB_MAX_OVERFLOW", int),
+    "pool_timeout": ("METR_DB_POOL_TIMEOUT", float),
+    "pool_recycle": ("METR_DB_POOL_RECYCLE", int),
+    "pool_pre_ping": ("METR_DB_POOL_PRE_PING", _parse_bool),
+}
+
+# A Lambda container serves one request at a time, so a small pool is enough and
+# keeps many concurrent containers from exhausting the database connections.
+# Connections are checked and recycled as they may go stale while the container
+# is frozen between invocations.
+DEFAULT_POOL_SETTINGS: dict[str, Any] = {"pool_pre_ping": True, "pool_recycle": 300}
+DEFAULT_QUEUE_POOL_SETTINGS: dict[str, Any] = {"pool_size": 1, "max_overflow": 1}
+
+# How reads are spread over the replicas
+REPLICA_STRATEGIES = ("round_robin", "least_loaded")
+
+
+class LazySessionmaker(sessionmaker[OrmSession]):
+    """Session factory configuring the database on first use."""
+
+    def __call__(self, **local_kw: Any) -> OrmSession:
+        if self.kw.get("bind") is None:
+            init_database()
+        return super().__call__(**local_kw)
+
+
+Session = LazySessionmaker()
+
+# The engine lives at module level so warm invocations reuse its connection pool
+_engine: Optional[Engine] = None
+_engine_key: Optional[tuple] = None
+
+# Engines of the read replicas, with their number of checked out connections
+_replica_engines: list[Engine] = []
+_replica_load: dict[Engine, int] = {}
+_replica_turns = itertools.count()
+_replica_strategy = "round_robin"
+
+# Reads go to the primary for this many seconds after a write of this process
+_read_your_writes = 0.0
+_last_write = float("-inf")
+
+
+def pool_settings_from_env() -> dict[str, Any]:
+    return {
+        setting: parse(os.environ[env_var])
+        for setting, (env_var, parse) in POOL_SETTINGS_ENV.items()
+        if env_var in os.environ
+    }
+
+
+def is_memory_database(conn_url: str) -> bool:
+    url = make_url(conn_url)
+    return url.get_backend_name() == "sqlite" and (
+        url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+    )
+
+
+def engine_settings(conn_url: str, pool_settings: dict[str, Any]) -> dict[str, Any]:
+    settings: dict[str, Any] = {}
+    # An in-memory SQLite database only lives as long as its connection, so that
+    # connection is never recycled
+    if not is_memory_database(conn_url):
+        settings.update(DEFAULT_POOL_SETTINGS)
+    # File SQLite databases are local and keep the default size of their pool
+    if make_url(conn_url).get_backend_name() != "sqlite":
+        settings.update(DEFAULT_QUEUE_POOL_SETTINGS)
+    settings.update(pool_settings_from_env())
+    settings.update(pool_settings)
+    return settings
+
+
+def configure_database(
+    conn_url: Optional[str] = None,
+    replica_urls: Optional[list[str]] = None,
+    replica_strategy: Optional[str] = None,
+    read_your_writes: Optional[float] = None,
+    **pool_settings: Any,
+) -> Engine:
+    """Configure the primary database and its read replicas, if any.
+
+    Reads are spread over the replicas `round_robin` or to the `least_loaded`
+    one, and go to the primary for `read_your_writes` seconds after a write.
+    """
+    global _engine, _engine_key, _replica_engines, _replica_strategy
+    global _read_your_writes
+
+    conn_url = conn_url or os.environ.get("METR_DATABASE_URL", DEFAULT_DATABASE_URL)
+    if replica_urls is None:
+        replica_urls = [
+            url
+            for url in os.environ.get("METR_DATABASE_REPLICA_URLS", "").split(",")
+            if url
+        ]
+    replica_strategy = replica_strategy or os.environ.get(
+        "METR_DATABASE_REPLICA_STRATEGY", "round_robin"
+    )
+    if replica_strategy not in REPLICA_STRATEGIES:
+        raise ValueError(f"Invalid replica strategy: {replica_strategy}")
+    if read_your_writes is None:
+        read_your_writes = float(os.environ.get("METR_DATABASE_READ_YOUR_WRITES", 0))
+
+    _replica_strategy = replica_strategy
+    _read_your_writes = read_your_writes
+
+    # Reuse the current engines unless the configuration changed
+    settings = engine_settings(conn_url, pool_settings)
+    key = (conn_url, tuple(replica_urls), tuple(sorted(settings.items())))
+    if _engine is not None and key == _engine_key:
+        return _engine
+
+    for engine in [_engine, *_replica_engines]:
+        if engine is not None:
+            engine.dispose()
+            _replica_load.pop(engine, None)
+
+    _engine = create_engine(conn_url, future=True, **settings)
+    _engine_key = key
+    _replica_engines = [
+        track_load(
+            create_engine(url, future=True, **engine_settings(url, pool_settings))
+        )
+        for url in replica_urls
+    ]
+    Session.configure(bind=_engine, future=True)
+    return _engine
+
+
+def init_database() -> Engine:
+    """Configure the database from the environment unless already done.
+
+    Meant to be called during the Lambda init phase, so the first request does not
+    pay for it.
+    """
+    if _engine is None:
+        return configure_database()
+    return _engine
+
+
+def read_engine() -> Engine:
+    """Engine for read-only work, a replica unless none is configured or this
+    process wrote within the read-your-writes window.
+
+    The read-only handlers open their sessions on it.
+    """
+    primary = init_database()
+    if not _replica_engines or time.monotonic() - _last_write < _read_your_writes:
+        return primary
+
+    # Start from the next replica in turn, so ties between the least loaded
+    # replicas are also broken round-robin
+    turn = next(_replica_turns) % len(_replica_engines)
+    if _replica_strategy == "round_robin":
+        return _replica_engines[turn]
+    replicas = _replica_engines[turn:] + _replica_engines[:turn]
+    return min(replicas, key=_replica_load.__getitem__)
+
+
+def track_load(engine: Engine) -> Engine:
+    """Keep count of the connections checked out of the engine's pool."""
+    _replica_load[engine] = 0
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        _replica_load[engine] += 1
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        _replica_load[engine] -= 1
+
+    return engine
+
+
+@event.listens_for(Session, "after_commit")
+def _record_write(session: OrmSession) -> None:
+    global _last_write
+    if session.get_bind() is _engine:
+        _last_write = time.monotonic()
+
+
+def dispose_after_fork() -> None:
+    """Drop the pooled connections inherited from a parent process.
 
-def configure_database(conn_url: str = "sqlite://"):
-    engine = create_engine(conn_url, future=True)
-    Session.configure(bind=engine, future=True)
+    The connections are left open for the parent, and the child opens its own.
+    """
+    if _engine is not None:
+        _engine.dispose(close=False)
+    for engine in _replica_engines:
+        engine.dispose(close=False)
+        _replica_load[engine] = 0
@@ -0,0 +1,211 @@
+"""Local HTTP server running the Lambda handler, for development and load testing.
+
+Usage: python -m metr.devserver [--port 8000] [--mode threads|processes]
+    [--workers 4] [--database-url sqlite:///metr.db] [--create-tables]
+
+HTTP requests are turned into API Gateway HTTP API (v2) events, as
+`tests.factories` builds them, and dispatched to `metr.api.handler`. Workers are
+either threads sharing one engine, or pre-forked processes each serving one
+request at a time with their own engine, like Lambda containers do.
+"""
+
+import argparse
+import base64
+import logging
+import os
+import signal
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from aws_lambda_typing.context import Context
+from aws_lambda_typing.events import APIGatewayProxyEventV2
+
+from metr import api, database
+
+logger = logging.getLogger(__name__)
+
+SERVER_MODES = ("threads", "processes")
+
+
+class LocalContext(Context):
+    def __init__(self) -> None:
+        self.aws_request_id = str(uuid.uuid4())
+
+    @staticmethod
+    def get_remaining_time_in_millis() -> int:
+        return 30_000
+
+
+def build_event(
+    method: str,
+    target: str,
+    headers: dict[str, str],
+    body: str = "",
+    source_ip: str = "127.0.0.1",
+) -> APIGatewayProxyEventV2:
+    """API Gateway v2 event of an HTTP request to `target` (path and query)."""
+    url = urlsplit(target)
+    headers = {name.lower(): value for name, value in headers.items()}
+    return APIGatewayProxyEventV2(
+        version="2.0",
+        routeKey="$default",
+        rawPath=url.path,
+        rawQueryString=url.query,
+        cookies=[cookie for cookie in headers.get("cookie", "").split("; ") if cookie],
+        headers=headers,
+        queryStringParameters={p: ",".join(v) for p, v in parse_qs(url.query).items()},
+        requestContext={
+            "timeEpoch": int(time.time() * 1000),
+            "domainName": headers.get("host", "localhost"),
+            "http": {
+                "method": method,
+                "path": url.path,
+                "protocol": "HTTP/1.1",
+                "sourceIp": source_ip,
+                "userAgent": headers.get("user-agent", ""),
+            },
+        },
+        body=body,
+        pathParameters={},
+        isBase64Encoded=False,
+        stageVariables={},
+    )
+
+
+class LambdaRequestHandler(BaseHTTPRequestHandler):
+    # Keep connections open between requests, as load generators expect, and
+    # send the headers and body without waiting for the client's delayed ACK
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def dispatch(self) -> None:
+        length = int(self.headers.get("content-length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+        event = build_event(
+            self.command, self.path, dict(self.headers), body, self.client_address[0]
+        )
+        response = api.handler(event, LocalContext())
+
+        payload = response.get("body") or ""
+        data = (
+            base64.b64decode(payload)
+            if response.get("isBase64Encoded")
+            else payload.encode()
+        )
+        self.send_response(response["statusCode"])
+        for name, value in (response.get("headers") or {}).items():
+            self.send_header(name, str(value))
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = dispatch
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTP server handling its connections on a fixed pool of threads."""
+
+    def __init__(self, server_address, handler_class, workers: int):
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address) -> None:
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+def serve_threads(host: str, port: int, workers: int) -> None:
+    with PooledHTTPServer((host, port), LambdaRequestHandler, workers) as server:
+        logger.info("Serving on %s:%d with %d threads", host, port, workers)
+        server.serve_forever()
+
+
+def serve_processes(host: str, port: int, workers: int) -> None:
+    # The socket is bound before forking so every worker accepts on it
+    server = HTTPServer((host, port), LambdaRequestHandler)
+    logger.info("Serving on %s:%d with %d processes", host, port, workers)
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            database.dispose_after_fork()
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+    finally:
+        server.server_close()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--mode", choices=SERVER_MODES, default="threads")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--database-url", help="defaults to $METR_DATABASE_URL")
+    parser.add_argument(
+        "--create-tables", action="store_true", help="create the missing tables"
+    )
+    args = parser.parse_args(argv)
+
+    # Each connection to an in-memory SQLite database gets its own empty database,
+    # so the workers would not share any table
+    database_url = args.database_url or os.environ.get(
+        "METR_DATABASE_URL", database.DEFAULT_DATABASE_URL
+    )
+    if database.is_memory_database(database_url):
+        parser.error(
+            f"cannot serve the in-memory database {database_url}, "
+            "use a file such as --database-url sqlite:///metr.db"
+        )
+
+    logging.basicConfig(level=logging.INFO)
+    # Threads share the engine, so its pool gets a connection per thread
+    if args.mode == "threads":
+        engine = database.configure_database(database_url, pool_size=args.workers)
+    else:
+        engine = database.configure_database(database_url)
+    if args.create_tables:
+        database.Base.metadata.create_all(bind=engine)
+
+    try:
+        if args.mode == "threads":
+            serve_threads(args.host, args.port, args.workers)
+        else:
+            serve_processes(args.host, args.port, args.workers)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
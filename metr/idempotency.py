@@ -0,0 +1,228 @@
+"""Replay of the responses of requests retried with the same `Idempotency-Key`.
+
+Responses are kept in an in-process cache, and in the database so retries landing
+on another container are replayed too. A key is reserved in the database before
+the request runs, so attempts arriving while it is in progress are refused
+instead of running it again. Server errors are not kept, so the request can be
+retried.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Callable, Optional, TypeVar, cast
+
+from sqlalchemy import CursorResult, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from metr.cache import CacheBackend, LRUCache
+from metr.database import Session
+from metr.models import IdempotencyKey
+from metr.responses import json_response
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable)
+
+# Seconds during which a response is replayed
+IDEMPOTENCY_TTL = float(os.environ.get("METR_IDEMPOTENCY_TTL", 24 * 60 * 60))
+# Seconds after which the reservation of a request that never completed lapses
+RESERVATION_TTL = float(os.environ.get("METR_IDEMPOTENCY_RESERVATION_TTL", 60))
+MAX_KEY_LENGTH = 255
+
+response_cache: CacheBackend = LRUCache(
+    maxsize=int(os.environ.get("METR_IDEMPOTENCY_CACHE_SIZE", 1024)),
+    ttl=IDEMPOTENCY_TTL,
+)
+
+
+def request_fingerprint(event) -> str:
+    request = "\n".join(
+        (
+            event["requestContext"]["http"]["method"],
+            event.get("rawPath", ""),
+            event.get("body") or "",
+        )
+    )
+    return hashlib.blake2b(request.encode(), digest_size=16).hexdigest()
+
+
+def load_response(key: str) -> Optional[tuple[str, Optional[dict]]]:
+    """Fingerprint and response stored for the key, unless expired.
+
+    The response is None while the request is in progress.
+    """
+    stored = response_cache.get(key)
+    if stored is None:
+        stored = load_stored_response(key)
+        # In-progress requests are not cached, their response comes later
+        if stored is not None and stored[1] is not None:
+            response_cache.set(key, stored)
+    return stored
+
+
+def load_stored_response(key: str) -> Optional[tuple[str, Optional[dict]]]:
+    with Session() as session:
+        row = session.execute(
+            select(IdempotencyKey.fingerprint, IdempotencyKey.response).where(
+                IdempotencyKey.key == key, IdempotencyKey.expires_at > time.time()
+            )
+        ).one_or_none()
+    if row is None:
+        return None
+    return row.fingerprint, row.response and json.loads(row.response)
+
+
+def reserve_key(key: str, fingerprint: str) -> bool:
+    """Reserve the key for a request about to run, False if already taken.
+
+    Expired keys are purged on the way, so they can be reused.
+    """
+    with Session() as session:
+        try:
+            session.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.expires_at <= time.time())
+            )
+            session.execute(
+                insert(IdempotencyKey).values(
+                    key=key,
+                    fingerprint=fingerprint,
+                    response=None,
+                    expires_at=time.time() + RESERVATION_TTL,
+                )
+            )
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            return False
+    return True
+
+
+def release_key(key: str, fingerprint: str) -> None:
+    """Drop the reservation of a request that failed, so it can be retried."""
+    with Session() as session:
+        session.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.key == key,
+                IdempotencyKey.fingerprint == fingerprint,
+                IdempotencyKey.response.is_(None),
+            )
+        )
+        session.commit()
+
+
+def store_response(key: str, fingerprint: str, response: dict) -> bool:
+    """Store the response of the request which reserved the key.
+
+    False if the reservation lapsed in the meantime, the response is then dropped.
+    """
+    with Session() as session:
+        result = session.execute(
+            update(IdempotencyKey)
+            .where(
+                IdempotencyKey.key == key,
+                IdempotencyKey.fingerprint == fingerprint,
+                IdempotencyKey.response.is_(None),
+            )
+            .values(
+                response=json.dumps(response),
+                expires_at=time.time() + IDEMPOTENCY_TTL,
+            )
+        )
+        session.commit()
+    stored = cast(CursorResult, result).rowcount == 1
+    if stored:
+        response_cache.set(key, (fingerprint, response))
+    return stored
+
+
+def purge_expired() -> int:
+    """Delete the expired responses from the database, meant to run periodically."""
+    with Session() as session:
+        result = cast(
+            CursorResult,
+            session.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.expires_at <= time.time())
+            ),
+        )
+        session.commit()
+    return result.rowcount
+
+
+def idempotent(handler: F) -> F:
+    """Replay the first response of the requests retried with the same key."""
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        key = (event.get("headers") or {}).get("idempotency-key")
+        if not key:
+            return handler(event, context)
+        if len(key) > MAX_KEY_LENGTH:
+            return json_response(
+                event,
+                400,
+                {"error": f"Idempotency key longer than {MAX_KEY_LENGTH} characters"},
+            )
+
+        fingerprint = request_fingerprint(event)
+        try:
+            stored = load_response(key)
+            if stored is None and not reserve_key(key, fingerprint):
+                # Another attempt reserved the key in the meantime
+                stored = load_stored_response(key) or (fingerprint, None)
+        except Exception:
+            # Run the request unprotected rather than failing it
+            logger.exception("Could not reserve idempotency key %s", key)
+            return handler(event, context)
+
+        if stored is not None:
+            stored_fingerprint, stored_response = stored
+            if stored_fingerprint != fingerprint:
+                return json_response(
+                    event,
+                    422,
+                    {"error": "Idempotency key already used for another request"},
+                )
+            if stored_response is None:
+                return json_response(
+                    event,
+                    409,
+                    {"error": "A request with this idempotency key is in progress"},
+                    {"retry-after": "1"},
+                )
+            return replayed(stored_response)
+
+        try:
+            response = dict(handler(event, context))
+        except BaseException:
+            release(key, fingerprint)
+            raise
+        if response["statusCode"] >= 500:
+            release(key, fingerprint)
+            return response
+
+        try:
+            if not store_response(key, fingerprint, response):
+                logger.warning("Reservation of idempotency key %s lapsed", key)
+        except Exception:
+            logger.exception("Could not store the response of idempotency key %s", key)
+        return response
+
+    return cast(F, wrapper)
+
+
+def release(key: str, fingerprint: str) -> None:
+    try:
+        release_key(key, fingerprint)
+    except Exception:
+        logger.exception("Could not release idempotency key %s", key)
+
+
+def replayed(response: dict) -> dict:
+    return {
+        **response,
+        "headers": {**response["headers"], "idempotent-replayed": "true"},
+    }
@@ -0,0 +1,251 @@
+"""Bulk import of meters from NDJSON or CSV files.
+
+Usage: python -m metr.importer meters.ndjson --errors rejected.ndjson
+"""
+
+import argparse
+import csv
+import json
+import logging
+import sys
+import time
+from typing import Any, Callable, Iterator, Optional, TextIO
+
+from pydantic import ValidationError
+from sqlalchemy import or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from metr.changes import record_changes
+from metr.database import Session, configure_database
+from metr.models import Meter, MeterInput
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("ndjson", "csv")
+CONFLICT_MODES = ("update", "skip")
+
+# Dialects supporting `INSERT ... ON CONFLICT`
+UPSERT_INSERTS: dict[str, Callable[..., Any]] = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def read_records(stream: TextIO, fmt: str) -> Iterator[tuple[int, object]]:
+    """Yield `(line number, record)` pairs, records being `None` if unparsable."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # Empty CSV cells stand for missing values
+            yield reader.line_num, {
+                key: (value if value != "" else None) for key, value in record.items()
+            }
+        return
+
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except json.JSONDecodeError:
+            yield line_num, None
+
+
+def import_meters(
+    stream: TextIO,
+    fmt: str = "ndjson",
+    errors: Optional[TextIO] = None,
+    batch_size: int = 1_000,
+    on_conflict: str = "update",
+) -> dict:
+    """Upsert the meters read from `stream`, writing rejected rows to `errors`."""
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Invalid import format: {fmt}")
+    if on_conflict not in CONFLICT_MODES:
+        raise ValueError(f"Invalid conflict mode: {on_conflict}")
+
+    stats: dict[str, Any] = {
+        "read": 0,
+        "inserted": 0,
+        "updated": 0,
+        "skipped": 0,
+        "rejected": 0,
+    }
+    started = time.perf_counter()
+
+    def reject(line_num: int, record: object, reason: object) -> None:
+        stats["rejected"] += 1
+        if errors is not None:
+            errors.write(
+                json.dumps(
+                    {"line": line_num, "record": record, "errors": reason}, default=str
+                )
+                + "\n"
+            )
+
+    session = Session()
+    try:
+        dialect = session.get_bind().dialect.name
+        if dialect not in UPSERT_INSERTS:
+            raise ValueError(f"Bulk import is not supported on {dialect}")
+        statement = _upsert_statement(dialect, on_conflict)
+
+        batch: list[tuple[int, object, dict]] = []
+        for line_num, record in read_records(stream, fmt):
+            stats["read"] += 1
+            if record is None:
+                reject(line_num, record, "Invalid JSON format")
+                continue
+
+            try:
+                row = MeterInput.model_validate(record).to_row()
+                batch.append((line_num, record, row))
+            except ValidationError as e:
+                reject(line_num, record, e.errors(include_url=False))
+                continue
+
+            if len(batch) >= batch_size:
+                _import_batch(session, statement, batch, on_conflict, stats, reject)
+                batch = []
+
+        if batch:
+            _import_batch(session, statement, batch, on_conflict, stats, reject)
+
+    finally:
+        session.close()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = elapsed
+    stats["rows_per_sec"] = stats["read"] / elapsed if elapsed else 0.0
+    logger.info(
+        "Imported %(read)d meters at %(rows_per_sec).0f rows/sec: %(inserted)d "
+        "inserted, %(updated)d updated, %(skipped)d skipped, %(rejected)d rejected",
+        stats,
+    )
+    return stats
+
+
+def _import_batch(session, statement, batch, on_conflict, stats, reject) -> None:
+    # Later rows of the batch win over earlier ones with the same meter ID
+    rows: dict[int, tuple[int, object, dict]] = {}
+    for line_num, record, row in batch:
+        superseded = rows.get(row["meter_id"])
+        if superseded is not None:
+            reject(superseded[0], superseded[1], f"Superseded by line {line_num}")
+        rows[row["meter_id"]] = (line_num, record, row)
+
+    # Find the current owners of the meter IDs and external references of the
+    # batch with a single query
+    query = select(Meter.meter_id, Meter.external_reference).where(
+        or_(
+            Meter.meter_id.in_(list(rows)),
+            Meter.external_reference.in_(
+                [row["external_reference"] for _, _, row in rows.values()]
+            ),
+        )
+    )
+    existing_ids = set()
+    ref_owners = {}
+    for meter_id, external_reference in session.execute(query):
+        existing_ids.add(meter_id)
+        ref_owners[external_reference] = meter_id
+
+    # The conflict target is `meter_id`, so an external reference owned by
+    # another meter cannot be resolved by the upsert and the row is rejected
+    accepted = []
+    for line_num, record, row in rows.values():
+        owner = ref_owners.setdefault(row["external_reference"], row["meter_id"])
+        if owner != row["meter_id"]:
+            reject(line_num, record, "Duplicate external reference")
+        else:
+            accepted.append((line_num, record, row))
+
+    if not accepted:
+        return
+
+    # Skipped rows leave their meter unchanged
+    def changed_ids(rows):
+        return [
+            row["meter_id"]
+            for _, _, row in rows
+            if on_conflict == "update" or row["meter_id"] not in existing_ids
+        ]
+
+    try:
+        session.execute(statement, [row for _, _, row in accepted])
+        record_changes(session, changed_ids(accepted), "upsert")
+        session.commit()
+    except IntegrityError:
+        # Retry the rows one by one to single out the offending ones
+        session.rollback()
+        succeeded = []
+        for line_num, record, row in accepted:
+            try:
+                session.execute(statement, row)
+                record_changes(
+                    session, changed_ids([(line_num, record, row)]), "upsert"
+                )
+                session.commit()
+                succeeded.append((line_num, record, row))
+            except IntegrityError as e:
+                session.rollback()
+                reject(line_num, record, str(e.orig))
+        accepted = succeeded
+
+    for _, _, row in accepted:
+        if row["meter_id"] not in existing_ids:
+            stats["inserted"] += 1
+        elif on_conflict == "update":
+            stats["updated"] += 1
+        else:
+            stats["skipped"] += 1
+
+
+def _upsert_statement(dialect: str, on_conflict: str):
+    statement = UPSERT_INSERTS[dialect](Meter)
+    if on_conflict == "skip":
+        return statement.on_conflict_do_nothing(index_elements=[Meter.meter_id])
+    return statement.on_conflict_do_update(
+        index_elements=[Meter.meter_id],
+        set_={
+            **{
+                column.name: statement.excluded[column.name]
+                for column in Meter.__table__.columns
+                if not column.primary_key
+                and column.name not in ("version", "created_stamp")
+            },
+            "version": Meter.version + 1,
+        },
+    )
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="NDJSON or CSV file to import")
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument("--errors", help="file receiving the rejected rows")
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    parser.add_argument("--on-conflict", choices=CONFLICT_MODES, default="update")
+    parser.add_argument("--database-url", help="defaults to $METR_DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    configure_database(args.database_url)
+
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    with open(args.path, newline="") as stream:
+        if args.errors:
+            with open(args.errors, "w") as errors:
+                stats = import_meters(
+                    stream, fmt, errors, args.batch_size, args.on_conflict
+                )
+        else:
+            stats = import_meters(stream, fmt, None, args.batch_size, args.on_conflict)
+
+    json.dump(stats, sys.stdout)
+    return 1 if stats["rejected"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
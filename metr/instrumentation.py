@@ -0,0 +1,154 @@
+"""Per-request timing of the handlers and of their SQL statements.
+
+Each instrumented handler emits one structured log line on the `metr.requests`
+logger with its wall time, the time spent in the validation and serialization
+phases and the number and duration of the SQL statements it ran. Statements
+slower than `METR_SLOW_QUERY_MS` are logged along with their query plan.
+"""
+
+import contextlib
+import functools
+import json
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional, TypeVar, cast
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("metr.requests")
+
+F = TypeVar("F", bound=Callable)
+
+SLOW_QUERY_MS = float(os.environ.get("METR_SLOW_QUERY_MS", 100))
+
+
+class RequestMetrics:
+    def __init__(self, handler: str):
+        self.handler = handler
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+
+
+_current_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    "metr_request_metrics", default=None
+)
+
+
+def current_metrics() -> Optional[RequestMetrics]:
+    return _current_metrics.get()
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Add the time spent in the block to the named phase of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current_metrics.get()
+        if metrics is not None:
+            elapsed = time.perf_counter() - started
+            metrics.phases[name] = metrics.phases.get(name, 0.0) + elapsed
+
+
+def instrumented(handler: F) -> F:
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        metrics = RequestMetrics(handler.__name__)
+        token = _current_metrics.set(metrics)
+        try:
+            response = handler(event, context)
+        finally:
+            _current_metrics.reset(token)
+
+        if logger.isEnabledFor(logging.INFO):
+            http = (event.get("requestContext") or {}).get("http") or {}
+            logger.info(
+                json.dumps(
+                    {
+                        "handler": metrics.handler,
+                        "request_id": getattr(context, "aws_request_id", None),
+                        "method": http.get("method"),
+                        "path": event.get("rawPath"),
+                        "status": response.get("statusCode"),
+                        "duration_ms": _ms(time.perf_counter() - metrics.started),
+                        "phases_ms": {
+                            "db": _ms(metrics.sql_seconds),
+                            **{
+                                name: _ms(seconds)
+                                for name, seconds in metrics.phases.items()
+                            },
+                        },
+                        "sql_count": metrics.sql_count,
+                    }
+                )
+            )
+        return response
+
+    return cast(F, wrapper)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metr_query_started", []).append(time.perf_counter())
+
+
+def _end_statement(conn) -> float:
+    """Count the statement in the current request, returning its duration."""
+    elapsed = time.perf_counter() - conn.info["metr_query_started"].pop()
+
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.sql_count += 1
+        metrics.sql_seconds += elapsed
+    return elapsed
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = _end_statement(conn)
+    if elapsed * 1000 >= SLOW_QUERY_MS and not executemany:
+        logger.warning(
+            json.dumps(
+                {
+                    "slow_query_ms": _ms(elapsed),
+                    "statement": statement,
+                    "plan": query_plan(conn, statement, parameters),
+                },
+                default=str,
+            )
+        )
+
+
+# Failed statements never reach `after_cursor_execute`, their start time would
+# otherwise stay on the pooled connection
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context) -> None:
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("metr_query_started"):
+        _end_statement(conn)
+
+
+def query_plan(conn, statement: str, parameters) -> Optional[list[str]]:
+    # Explain through a raw DBAPI cursor so the statement does not go through
+    # the engine events again
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [" ".join(map(str, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except Exception:
+        logger.debug("Could not explain slow query", exc_info=True)
+        return None
@@ -1,10 +1,15 @@
 import datetime
+import functools
+import json
+import math
+import random
 from decimal import Decimal
-from typing import Optional
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Optional, Sequence
 
 # using pydantic to validate json input
 from pydantic import BaseModel, Field, StringConstraints
-from sqlalchemy import String
+from sqlalchemy import BigInteger, String, Text
 from sqlalchemy.orm import Mapped, mapped_column
 from typing_extensions import Annotated
 
@@ -16,10 +21,18 @@ class Meter(Base):
 
     meter_id: Mapped[int] = mapped_column(primary_key=True)
     external_reference: Mapped[str] = mapped_column(String(32), unique=True, index=True)
-    supply_start_date: Mapped[datetime.datetime]
-    supply_end_date: Mapped[Optional[datetime.datetime]]
+    # Indexed to serve the range filters of `GET /meters`
+    supply_start_date: Mapped[datetime.datetime] = mapped_column(index=True)
+    supply_end_date: Mapped[Optional[datetime.datetime]] = mapped_column(index=True)
     enabled: Mapped[bool]
-    annual_quantity: Mapped[float]
+    annual_quantity: Mapped[float] = mapped_column(index=True)
+    # Incremented by every update, so writers can detect concurrent changes
+    version: Mapped[int] = mapped_column(default=1, server_default="1")
+    # Random and set once at creation, so a meter deleted and created again with
+    # the same ID and version still gets other ETags
+    created_stamp: Mapped[int] = mapped_column(
+        BigInteger, default=lambda: random.getrandbits(62), server_default="0"
+    )
 
     def to_dict(self):
         """Convert the Meter object to a dictionary."""
@@ -34,9 +47,99 @@ class Meter(Base):
             ),
             "enabled": self.enabled,
             "annual_quantity": self.annual_quantity,
+            "version": self.version,
         }
 
 
+class MeterChange(Base):
+    """Latest change of each meter written through the API or the importer.
+
+    Older changes of a meter are replaced, so reading the changes since a token
+    costs one row per changed meter. Deleted meters are kept as tombstones.
+    """
+
+    __tablename__ = "meter_change"
+    # SQLite must not reuse the IDs of replaced changes, as tokens refer to them
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    change_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    meter_id: Mapped[int] = mapped_column(unique=True)
+    operation: Mapped[str] = mapped_column(String(8))
+
+
+CHANGE_OPERATIONS = ("upsert", "delete")
+
+
+class IdempotencyKey(Base):
+    """Response of a request sent with an `Idempotency-Key` header."""
+
+    __tablename__ = "idempotency_key"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    # Hash of the request, so a key reused for another request is detected
+    fingerprint: Mapped[str] = mapped_column(String(64))
+    # Unset while the request is in progress
+    response: Mapped[Optional[str]] = mapped_column(Text)
+    expires_at: Mapped[float] = mapped_column(index=True)
+
+
+# Fields of the serialized meters, in the order of `Meter.to_dict()`
+METER_FIELDS = (
+    "meter_id",
+    "external_reference",
+    "supply_start_date",
+    "supply_end_date",
+    "enabled",
+    "annual_quantity",
+    "version",
+)
+
+
+def _encode_datetime(value: Optional[datetime.datetime]) -> str:
+    return f'"{value.isoformat()}"' if value else "null"
+
+
+def _encode_bool(value: bool) -> str:
+    return "true" if value else "false"
+
+
+def _encode_float(value: float) -> str:
+    # `float.__repr__` is what `json.dumps` uses for finite floats
+    if type(value) is float and math.isfinite(value):
+        return float.__repr__(value)
+    return json.dumps(value)
+
+
+# JSON encoders of the column values, producing the same text as `json.dumps`
+METER_FIELD_ENCODERS: dict[str, Callable[[Any], str]] = {
+    "meter_id": int.__repr__,
+    "external_reference": encode_basestring_ascii,
+    "supply_start_date": _encode_datetime,
+    "supply_end_date": _encode_datetime,
+    "enabled": _encode_bool,
+    "annual_quantity": _encode_float,
+    "version": int.__repr__,
+}
+
+
+@functools.lru_cache
+def compile_row_encoder(
+    fields: tuple[str, ...] = METER_FIELDS,
+) -> Callable[[Sequence[Any]], str]:
+    """Build a function serializing rows of the given columns to JSON objects.
+
+    The output is byte-identical to `json.dumps()` of the matching `Meter.to_dict()`
+    items, without building a dictionary per row.
+    """
+    template = "{" + ", ".join(f"{json.dumps(field)}: %s" for field in fields) + "}"
+    encoders = tuple(METER_FIELD_ENCODERS[field] for field in fields)
+
+    def encode_row(row: Sequence[Any]) -> str:
+        return template % tuple(encode(value) for encode, value in zip(encoders, row))
+
+    return encode_row
+
+
 # Pydantic Model for Validation
 class MeterInput(BaseModel):
     meter_id: int
@@ -49,6 +152,23 @@ class MeterInput(BaseModel):
     class ConfigDict:
         str_strip_whitespace = True
 
+    def to_row(self) -> dict[str, Any]:
+        """Convert the validated input to the column values of a Meter row."""
+        return {
+            "meter_id": self.meter_id,
+            "external_reference": self.external_reference,
+            "supply_start_date": datetime.datetime.combine(
+                self.supply_start_date, datetime.time()
+            ),
+            "supply_end_date": (
+                datetime.datetime.combine(self.supply_end_date, datetime.time())
+                if self.supply_end_date
+                else None
+            ),
+            "enabled": self.enabled,
+            "annual_quantity": float(self.annual_quantity),
+        }
+
 
 # Pydantic Model for Validation only for Patch
 # All Values are optional as patch body can have a single value to be updated
@@ -66,14 +186,63 @@ class MeterInputPatch(BaseModel):
     class ConfigDict:
         str_strip_whitespace = True
 
+    def to_values(self) -> dict[str, Any]:
+        """Convert the fields set in the input to column values of a Meter row."""
+        values = self.model_dump(exclude_unset=True)
+        for key, value in values.items():
+            if isinstance(value, datetime.date):
+                values[key] = datetime.datetime.combine(value, datetime.time())
+            elif isinstance(value, Decimal):
+                values[key] = float(value)
+        return values
+
 
 # Pydantic Model for query params
+# Range filters are passed as `field[operator]`, e.g. `supply_start_date[gte]`
 class MeterInputQueryParams(BaseModel):
     external_reference: Optional[str] = Field(None, max_length=32)
     supply_start_date: Optional[datetime.date] = None
+    supply_start_date_gt: Optional[datetime.date] = Field(
+        None, alias="supply_start_date[gt]"
+    )
+    supply_start_date_gte: Optional[datetime.date] = Field(
+        None, alias="supply_start_date[gte]"
+    )
+    supply_start_date_lt: Optional[datetime.date] = Field(
+        None, alias="supply_start_date[lt]"
+    )
+    supply_start_date_lte: Optional[datetime.date] = Field(
+        None, alias="supply_start_date[lte]"
+    )
     supply_end_date: Optional[datetime.date] = None
+    supply_end_date_gt: Optional[datetime.date] = Field(
+        None, alias="supply_end_date[gt]"
+    )
+    supply_end_date_gte: Optional[datetime.date] = Field(
+        None, alias="supply_end_date[gte]"
+    )
+    supply_end_date_lt: Optional[datetime.date] = Field(
+        None, alias="supply_end_date[lt]"
+    )
+    supply_end_date_lte: Optional[datetime.date] = Field(
+        None, alias="supply_end_date[lte]"
+    )
     enabled: Optional[bool] = None
     annual_quantity: Optional[Decimal] = Field(None, gt=0)
+    annual_quantity_gt: Optional[Decimal] = Field(None, alias="annual_quantity[gt]")
+    annual_quantity_gte: Optional[Decimal] = Field(None, alias="annual_quantity[gte]")
+    annual_quantity_lt: Optional[Decimal] = Field(None, alias="annual_quantity[lt]")
+    annual_quantity_lte: Optional[Decimal] = Field(None, alias="annual_quantity[lte]")
+    # Meters whose supply interval includes the given date
+    active_on: Optional[datetime.date] = None
 
     class ConfigDict:
         str_strip_whitespace = True
+
+
+# Pydantic Model for looking up many meters at once
+class MeterLookupInput(BaseModel):
+    meter_ids: list[int] = Field(default_factory=list, max_length=1000)
+    external_references: list[Annotated[str, StringConstraints(max_length=32)]] = Field(
+        default_factory=list, max_length=1000
+    )
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import base64
+import gzip
+import json
+import logging
+import os
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from aws_lambda_typing.events import APIGatewayProxyEventV2
+    from aws_lambda_typing.responses import APIGatewayProxyResponseV2
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this many bytes are not worth compressing
+COMPRESSION_MIN_SIZE = int(os.environ.get("METR_COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_LEVEL = int(os.environ.get("METR_COMPRESSION_LEVEL", 6))
+
+# Supported content codings, in order of preference
+COMPRESSORS = {
+    "gzip": lambda data, level: gzip.compress(data, compresslevel=level, mtime=0),
+    # HTTP `deflate` is the zlib format, not a raw deflate stream
+    "deflate": lambda data, level: zlib.compress(data, level),
+}
+
+# Totals of the compressed responses, so the ratio and time can be monitored
+compression_stats = {"responses": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+
+
+def accepted_encoding(event: APIGatewayProxyEventV2) -> Optional[str]:
+    """Preferred supported coding of the request's `Accept-Encoding` header."""
+    accept_encoding = (event.get("headers") or {}).get("accept-encoding", "")
+
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        try:
+            quality = float(params.strip().removeprefix("q=")) if params else 1.0
+        except ValueError:
+            continue
+        qualities[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for coding in COMPRESSORS:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def response_encoding(event: APIGatewayProxyEventV2, body: str) -> Optional[str]:
+    """Coding a response with this body is compressed with, if any."""
+    if not body or len(body) < COMPRESSION_MIN_SIZE:
+        return None
+    return accepted_encoding(event)
+
+
+# Each content coding of a response has its own strong ETag, the ETag of the
+# identity coding suffixed with the coding name
+def coded_etag(etag: str, encoding: Optional[str]) -> str:
+    if encoding is None or etag.startswith("W/"):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def uncoded_etag(etag: str) -> str:
+    for encoding in COMPRESSORS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag.removesuffix(suffix) + '"'
+    return etag
+
+
+def build_response(
+    event: APIGatewayProxyEventV2,
+    status_code: int,
+    body: str = "",
+    headers: Optional[dict[str, str]] = None,
+) -> APIGatewayProxyResponseV2:
+    """Build a JSON response, compressed if the client accepts it and it pays off."""
+    headers = {"content-type": "application/json", **(headers or {})}
+
+    if not body or len(body) < COMPRESSION_MIN_SIZE:
+        return {"statusCode": status_code, "headers": headers, "body": body}
+
+    headers["vary"] = "accept-encoding"
+    encoding = response_encoding(event, body)
+    if encoding is None:
+        return {"statusCode": status_code, "headers": headers, "body": body}
+
+    started = time.perf_counter()
+    data = body.encode()
+    compressed = COMPRESSORS[encoding](data, COMPRESSION_LEVEL)
+    elapsed = time.perf_counter() - started
+
+    compression_stats["responses"] += 1
+    compression_stats["bytes_in"] += len(data)
+    compression_stats["bytes_out"] += len(compressed)
+    compression_stats["seconds"] += elapsed
+    logger.debug(
+        "Compressed %d bytes to %d bytes with %s in %.3f ms",
+        len(data),
+        len(compressed),
+        encoding,
+        elapsed * 1000,
+    )
+
+    headers["content-encoding"] = encoding
+    if "etag" in headers:
+        headers["etag"] = coded_etag(headers["etag"], encoding)
+    return {
+        "statusCode": status_code,
+        "headers": headers,
+        "body": base64.b64encode(compressed).decode(),
+        "isBase64Encoded": True,
+    }
+
+
+def json_response(
+    event: APIGatewayProxyEventV2,
+    status_code: int,
+    data: Any,
+    headers: Optional[dict[str, str]] = None,
+) -> APIGatewayProxyResponseV2:
+    return build_response(event, status_code, json.dumps(data), headers)
+
+
+def not_modified_response(
+    event: APIGatewayProxyEventV2, etag: str, body: str
+) -> APIGatewayProxyResponseV2:
+    """304 standing for a 200 response with this body and ETag."""
+    headers = {"etag": coded_etag(etag, response_encoding(event, body))}
+    if body and len(body) >= COMPRESSION_MIN_SIZE:
+        headers["vary"] = "accept-encoding"
+    return build_response(event, 304, "", headers)
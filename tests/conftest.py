@@ -2,7 +2,7 @@ import pytest
 from aws_lambda_typing.context import Context
 from sqlalchemy import text
 
-from metr import database
+from metr import api, database, idempotency
 from tests import factories
 
 
@@ -22,6 +22,28 @@ def fresh_db(setup_db):
         tablenames = [str(t) for t in database.Base.metadata.tables.values()]
         for table in tablenames:
             s.execute(text(f"DELETE FROM {table}"))
+    api.count_cache.clear()
+    api.meter_cache.clear()
+    idempotency.response_cache.clear()
+
+
+@pytest.fixture()
+def unconfigured_database(setup_db, monkeypatch):
+    # Hide the test engine rather than disposing of it, as that would drop the
+    # in-memory database
+    bind = database.Session.kw["bind"]
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.setattr(database, "_engine_key", None)
+    monkeypatch.setattr(database, "_replica_engines", [])
+    monkeypatch.setattr(database, "_replica_strategy", "round_robin")
+    monkeypatch.setattr(database, "_read_your_writes", 0.0)
+    monkeypatch.setattr(database, "_last_write", float("-inf"))
+    database.Session.configure(bind=None)
+    yield
+    for engine in [database._engine, *database._replica_engines]:
+        if engine is not None:
+            engine.dispose()
+    database.Session.configure(bind=bind)
 
 
 @pytest.fixture()
@@ -43,3 +65,16 @@ class MockContext(Context):
 @pytest.fixture()
 def lambda_context():
     return MockContext()
+
+
+@pytest.fixture()
+def call_api(lambda_context):
+    """Send a request through the single entry point of the API."""
+
+    def call(method, path, body="", query_string="", headers=None) -> dict:
+        event = factories.generate_api_gateway_proxy_event_v2(
+            method, path, query_string=query_string, body=body, headers=headers
+        )
+        return dict(api.handler(event, lambda_context))
+
+    return call
@@ -1,37 +1,59 @@
+import json
 import random
 import string
 import time
 from datetime import date, timedelta
-from typing import Literal, Optional
+from typing import Any, Literal, Optional
 from urllib.parse import parse_qs
 
 from aws_lambda_typing.events import APIGatewayProxyEventV2
 
 from metr.models import Meter
 
+# Supply dates cycle over this many days, so large datasets stay within `date.max`
+SUPPLY_DAYS = 36_500
 
-def generate_meters(count: int) -> list[Meter]:
+
+def generate_meters(count: int, start: int = 0) -> list[Meter]:
     return [
         Meter(
             meter_id=i,
             external_reference="".join(random.sample(string.printable, 10)),
-            supply_start_date=date.today() + timedelta(days=i),
+            supply_start_date=date.today() + timedelta(days=i % SUPPLY_DAYS),
             supply_end_date=(
-                date.today() + timedelta(days=10 * i) if random.random() < 0.5 else None
+                date.today() + timedelta(days=10 * (i % SUPPLY_DAYS))
+                if random.random() < 0.5
+                else None
             ),
             enabled=random.random() < 0.5,
             annual_quantity=random.random() * 100_000,
         )
-        for i in range(count)
+        for i in range(start, start + count)
     ]
 
 
+def generate_meter_body(meter_id: int, **changes: Any) -> str:
+    """JSON body of a meter to create or replace through the API."""
+    return json.dumps(
+        {
+            "meter_id": meter_id,
+            "external_reference": f"REF{meter_id}",
+            "supply_start_date": "2024-01-01",
+            "supply_end_date": None,
+            "enabled": True,
+            "annual_quantity": 100.0,
+            **changes,
+        }
+    )
+
+
 def generate_api_gateway_proxy_event_v2(
     method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"],
     path: str,
     path_params: Optional[dict[str, str]] = None,
     query_string: str = "",
     body: str = "",
+    headers: Optional[dict[str, str]] = None,
 ) -> APIGatewayProxyEventV2:
     return APIGatewayProxyEventV2(
         version="2.0",
@@ -39,7 +61,7 @@ def generate_api_gateway_proxy_event_v2(
         rawPath=path,
         rawQueryString=query_string,
         cookies=[],
-        headers={},
+        headers=headers or {},
         queryStringParameters={
             p: ",".join(v) for p, v in parse_qs(query_string).items()
         },
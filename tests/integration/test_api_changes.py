@@ -0,0 +1,99 @@
+import io
+import json
+
+from sqlalchemy import text
+
+from metr import api, database
+from metr.importer import import_meters
+from tests.factories import generate_meter_body
+
+
+def get_changes(call_api, query_string: str = "") -> dict:
+    resp = call_api("GET", "/meters/changes", query_string=query_string)
+    assert resp["statusCode"] == 200, resp["body"]
+    return json.loads(resp["body"])
+
+
+def test_changes(fresh_db, call_api):
+    call_api("POST", "/meters", generate_meter_body(1))
+    call_api("POST", "/meters", f"[{generate_meter_body(2)}, {generate_meter_body(3)}]")
+    call_api("PUT", "/meters/1", generate_meter_body(1, enabled=False))
+    call_api("PATCH", "/meters/2", json.dumps({"annual_quantity": 5}))
+    call_api("DELETE", "/meters/3")
+
+    changes = get_changes(call_api)["changes"]
+
+    # Only the latest change of each meter is kept
+    assert [(c["meter_id"], c["operation"]) for c in changes] == [
+        (1, "upsert"),
+        (2, "upsert"),
+        (3, "delete"),
+    ]
+    assert [c["change_id"] for c in changes] == sorted(c["change_id"] for c in changes)
+    assert changes[0]["meter"]["enabled"] is False
+    assert changes[1]["meter"]["annual_quantity"] == 5
+    assert changes[2]["meter"] is None
+
+
+def test_changes_since(fresh_db, call_api):
+    call_api("POST", "/meters", generate_meter_body(1))
+    call_api("POST", "/meters", generate_meter_body(2))
+    since = get_changes(call_api)["next_since"]
+
+    # Nothing changed since the token
+    body = get_changes(call_api, f"since={since}")
+    assert body["changes"] == []
+    assert body["next_since"] == since
+
+    call_api("PATCH", "/meters/1", json.dumps({"enabled": False}))
+    call_api("POST", "/meters", generate_meter_body(3))
+    body = get_changes(call_api, f"since={since}")
+    assert [c["meter_id"] for c in body["changes"]] == [1, 3]
+
+
+def test_changes_pages(fresh_db, call_api):
+    bodies = map(generate_meter_body, range(5))
+    call_api("POST", "/meters", "[" + ", ".join(bodies) + "]")
+
+    meter_ids = []
+    body = get_changes(call_api, "limit=2")
+    while True:
+        meter_ids += [c["meter_id"] for c in body["changes"]]
+        if body["next_link"] is None:
+            break
+        body = get_changes(call_api, body["next_link"].split("?", 1)[1])
+
+    assert meter_ids == [0, 1, 2, 3, 4]
+
+
+def test_changes_from_import(fresh_db, call_api):
+    call_api("POST", "/meters", generate_meter_body(1))
+    since = get_changes(call_api)["next_since"]
+
+    stream = io.StringIO(generate_meter_body(1) + "\n" + generate_meter_body(2) + "\n")
+    import_meters(stream, on_conflict="skip")
+
+    # The skipped meter did not change
+    changes = get_changes(call_api, f"since={since}")["changes"]
+    assert [c["meter_id"] for c in changes] == [2]
+
+
+def test_changes_query_plan(fresh_db):
+    # The page is read by a range search on the change ID, whatever the number of
+    # changes before the token
+    statement = api.changes_query(10, 101).compile(
+        dialect=database.init_database().dialect,
+        compile_kwargs={"literal_binds": True},
+    )
+    with database.Session() as session:
+        plan = session.execute(text(f"EXPLAIN QUERY PLAN {statement}")).all()
+    details = [row[-1] for row in plan]
+
+    assert any("USING INTEGER PRIMARY KEY (rowid>?)" in d for d in details)
+    assert not any("ORDER BY" in d for d in details)
+
+
+def test_changes_invalid_params(fresh_db, call_api):
+    for query_string in ("since=invalid", "limit=0", "limit=1001"):
+        resp = call_api("GET", "/meters/changes", query_string=query_string)
+        assert resp["statusCode"] == 400
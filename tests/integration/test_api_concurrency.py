@@ -0,0 +1,117 @@
+import io
+import json
+
+from metr.importer import import_meters
+from tests.factories import generate_meter_body
+
+
+def if_match(etag: str) -> dict[str, str]:
+    return {"if-match": etag}
+
+
+def with_version(etag: str, version: int) -> str:
+    """The ETag of the same meter at another version."""
+    return f'"{version}.{etag[1:-1].partition(".")[2]}"'
+
+
+def test_versions(fresh_db, call_api):
+    assert call_api("POST", "/meters", generate_meter_body(1))["statusCode"] == 201
+
+    resp = call_api("GET", "/meters/1")
+    etag = resp["headers"]["etag"]
+    assert etag.startswith('"1.')
+    assert json.loads(resp["body"])["version"] == 1
+
+    # Updates without `If-Match` are unconditional, and bump the version
+    resp = call_api("PUT", "/meters/1", generate_meter_body(1, enabled=False))
+    assert resp["headers"]["etag"] == with_version(etag, 2)
+    resp = call_api("PATCH", "/meters/1", json.dumps({"enabled": True}))
+    assert resp["headers"]["etag"] == with_version(etag, 3)
+
+    assert call_api("GET", "/meters/1")["headers"]["etag"] == with_version(etag, 3)
+
+
+def test_if_match(fresh_db, call_api):
+    call_api("POST", "/meters", generate_meter_body(1))
+    etag = call_api("GET", "/meters/1")["headers"]["etag"]
+    put_body = generate_meter_body(1, annual_quantity=5)
+    patch_body = json.dumps({"annual_quantity": 7})
+
+    # Two writers read the same version, the second one to write is refused
+    resp = call_api("PUT", "/meters/1", put_body, headers=if_match(etag))
+    assert resp["statusCode"] == 200
+    resp = call_api("PATCH", "/meters/1", patch_body, headers=if_match(etag))
+    assert resp["statusCode"] == 412
+    assert resp["headers"]["etag"] == with_version(etag, 2)
+    assert json.loads(resp["body"]) == {"error": "Meter was modified", "version": 2}
+
+    meter = json.loads(call_api("GET", "/meters/1")["body"])
+    assert meter["annual_quantity"] == 5
+
+    # Retrying with the current version succeeds
+    etags = f"{with_version(etag, 3)}, {with_version(etag, 2)}"
+    resp = call_api("PATCH", "/meters/1", patch_body, headers=if_match(etags))
+    assert resp["statusCode"] == 200
+    assert resp["headers"]["etag"] == with_version(etag, 3)
+
+
+def test_if_match_no_op_patch(fresh_db, call_api):
+    call_api("POST", "/meters", generate_meter_body(1))
+    etag = call_api("GET", "/meters/1")["headers"]["etag"]
+
+    resp = call_api("PATCH", "/meters/1", "{}", headers=if_match(etag))
+    assert resp["statusCode"] == 200
+    resp = call_api("PATCH", "/meters/1", "{}", headers=if_match(with_version(etag, 2)))
+    assert resp["statusCode"] == 412
+
+
+def test_if_match_any_or_invalid(fresh_db, call_api):
+    body = generate_meter_body(1)
+    call_api("POST", "/meters", body)
+
+    assert (
+        call_api("PUT", "/meters/1", body, headers=if_match("*"))["statusCode"] == 200
+    )
+    etag = call_api("GET", "/meters/1")["headers"]["etag"]
+
+    # Weak, content and version only ETags never match a version
+    for etag in (f"W/{etag}", '"abc"', '"2"'):
+        resp = call_api("PUT", "/meters/1", body, headers=if_match(etag))
+        assert resp["statusCode"] == 412
+
+
+def test_if_match_missing_meter(fresh_db, call_api):
+    resp = call_api("PUT", "/meters/1", generate_meter_body(1), headers=if_match('"1"'))
+    assert resp["statusCode"] == 404
+
+    patch_body = json.dumps({"enabled": False})
+    resp = call_api("PATCH", "/meters/1", patch_body, headers=if_match('"1"'))
+    assert resp["statusCode"] == 404
+
+
+def test_etags_of_recreated_meter(fresh_db, call_api):
+    call_api("POST", "/meters", generate_meter_body(1))
+    etag = call_api("GET", "/meters/1")["headers"]["etag"]
+
+    call_api("DELETE", "/meters/1")
+    call_api("POST", "/meters", generate_meter_body(1, enabled=False))
+
+    # The new meter is also at version 1, but under another ETag
+    resp = call_api("GET", "/meters/1", headers={"if-none-match": etag})
+    assert resp["statusCode"] == 200
+    assert json.loads(resp["body"])["version"] == 1
+    assert resp["headers"]["etag"] != etag
+
+    body = generate_meter_body(1, annual_quantity=5)
+    resp = call_api("PUT", "/meters/1", body, headers=if_match(etag))
+    assert resp["statusCode"] == 412
+
+
+def test_import_bumps_version(fresh_db, call_api):
+    call_api("POST", "/meters", generate_meter_body(1))
+
+    import_meters(io.StringIO(generate_meter_body(1, enabled=False) + "\n"))
+
+    meter = json.loads(call_api("GET", "/meters/1")["body"])
+    assert meter["enabled"] is False
+    assert meter["version"] == 2
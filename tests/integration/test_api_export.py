@@ -0,0 +1,33 @@
+import csv
+import io
+import json
+
+import pytest
+
+from metr import api
+
+
+def test_export_meters_ndjson(db_meters):
+    out = io.StringIO()
+    stats = api.export_meters(out, chunk_size=7)
+
+    lines = out.getvalue().splitlines()
+    assert stats["rows"] == len(db_meters) == len(lines)
+    assert [json.loads(line)["meter_id"] for line in lines] == sorted(
+        meter.meter_id for meter in db_meters
+    )
+    assert json.loads(lines[0]).keys() == db_meters[0].to_dict().keys()
+
+
+def test_export_meters_csv(db_meters):
+    out = io.StringIO()
+    stats = api.export_meters(out, fmt="csv")
+
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert stats["rows"] == len(rows) == len(db_meters)
+    assert rows[0]["external_reference"] == db_meters[0].external_reference
+
+
+def test_export_meters_invalid_format(fresh_db):
+    with pytest.raises(ValueError):
+        api.export_meters(io.StringIO(), fmt="xml")
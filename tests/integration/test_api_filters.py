@@ -0,0 +1,124 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func, select, text
+
+from metr import api, database
+from metr.models import Meter
+from tests.factories import generate_api_gateway_proxy_event_v2
+
+
+def _get_meter_ids(query_string, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string=f"{query_string}&limit=1000"
+    )
+    resp = api.get_meters(event, lambda_context)
+    assert resp["statusCode"] == 200
+    body = json.loads(resp["body"])
+    assert body["total_count"] == len(body["meters"])
+    return [meter["meter_id"] for meter in body["meters"]]
+
+
+def test_get_meters_date_range(db_meters, lambda_context):
+    start = date.today() + timedelta(days=10)
+    end = date.today() + timedelta(days=19)
+
+    meter_ids = _get_meter_ids(
+        f"supply_start_date[gte]={start}&supply_start_date[lte]={end}", lambda_context
+    )
+
+    assert meter_ids == list(range(10, 20))
+
+
+def test_get_meters_exclusive_date_range(db_meters, lambda_context):
+    start = date.today() + timedelta(days=10)
+    end = date.today() + timedelta(days=19)
+
+    meter_ids = _get_meter_ids(
+        f"supply_start_date[gt]={start}&supply_start_date[lt]={end}", lambda_context
+    )
+
+    assert meter_ids == list(range(11, 19))
+
+
+def test_get_meters_date_equality(db_meters, lambda_context):
+    day = date.today() + timedelta(days=10)
+
+    assert _get_meter_ids(f"supply_start_date={day}", lambda_context) == [10]
+
+
+def test_get_meters_quantity_range(db_meters, lambda_context):
+    meter_ids = _get_meter_ids("annual_quantity[lt]=50000", lambda_context)
+
+    assert meter_ids == [
+        meter.meter_id for meter in db_meters if meter.annual_quantity < 50_000
+    ]
+
+
+def test_get_meters_active_on(db_meters, lambda_context):
+    day = date.today() + timedelta(days=50)
+
+    meter_ids = _get_meter_ids(f"active_on={day}", lambda_context)
+
+    assert meter_ids == [
+        meter.meter_id
+        for meter in db_meters
+        if meter.supply_start_date <= day
+        and (meter.supply_end_date is None or meter.supply_end_date >= day)
+    ]
+
+
+def test_get_meters_invalid_range(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="supply_start_date[gte]=yesterday"
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 400
+
+
+def _query_plan(statement):
+    with database.Session() as session:
+        compiled = statement.compile(
+            bind=session.get_bind(), compile_kwargs={"literal_binds": True}
+        )
+        rows = session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return " ".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize(
+    "query_string, index",
+    [
+        (
+            "supply_start_date[gte]=2021-01-01&supply_start_date[lt]=2021-02-01",
+            "ix_meter_supply_start_date",
+        ),
+        (
+            "supply_end_date[gte]=2021-01-01&supply_end_date[lte]=2021-02-01",
+            "ix_meter_supply_end_date",
+        ),
+        ("annual_quantity[gt]=10&annual_quantity[lte]=20", "ix_meter_annual_quantity"),
+    ],
+)
+def test_range_filters_use_index(fresh_db, query_string, index):
+    params = dict(part.split("=") for part in query_string.split("&"))
+    filters = api.build_meter_filters(
+        api.MeterInputQueryParams(**params).model_dump(exclude_unset=True)
+    )
+
+    page_plan = _query_plan(
+        select(*api.METER_COLUMNS).where(*filters).order_by(Meter.meter_id).limit(11)
+    )
+    count_plan = _query_plan(select(func.count()).select_from(Meter).where(*filters))
+
+    assert f"USING INDEX {index}" in page_plan
+    assert index in count_plan
+
+
+def test_active_on_filter_uses_index(fresh_db):
+    filters = api.build_meter_filters({"active_on": date(2021, 1, 1)})
+
+    count_plan = _query_plan(select(func.count()).select_from(Meter).where(*filters))
+
+    assert "USING INDEX ix_meter_supply_start_date" in count_plan
@@ -0,0 +1,167 @@
+import json
+import time
+from unittest.mock import patch
+
+from sqlalchemy import func, select, update
+
+from metr import database, idempotency
+from metr.models import IdempotencyKey, MeterChange
+from tests.factories import generate_api_gateway_proxy_event_v2, generate_meter_body
+
+
+def idempotency_key(key: str) -> dict[str, str]:
+    return {"idempotency-key": key}
+
+
+def count_changes() -> int:
+    with database.Session() as session:
+        return session.execute(
+            select(func.count()).select_from(MeterChange)
+        ).scalar_one()
+
+
+def test_post_replay(fresh_db, call_api):
+    body = generate_meter_body(1)
+    headers = idempotency_key("key-1")
+    first = call_api("POST", "/meters", body, headers=headers)
+    assert first["statusCode"] == 201
+    assert "idempotent-replayed" not in first["headers"]
+
+    # The retry gets the first response instead of a conflict
+    retry = call_api("POST", "/meters", body, headers=headers)
+    assert retry["statusCode"] == 201
+    assert retry["body"] == first["body"]
+    assert retry["headers"]["idempotent-replayed"] == "true"
+
+    # Without a key, the retry runs again
+    assert call_api("POST", "/meters", body)["statusCode"] == 409
+
+
+def test_put_replay(fresh_db, call_api):
+    call_api("POST", "/meters", generate_meter_body(1))
+    body = generate_meter_body(1, enabled=False)
+    headers = idempotency_key("key-1")
+    first = call_api("PUT", "/meters/1", body, headers=headers)
+    assert first["headers"]["etag"].startswith('"2.')
+    call_api("PATCH", "/meters/1", json.dumps({"annual_quantity": 5}))
+    changes = count_changes()
+
+    # The replayed update does not overwrite the later patch
+    retry = call_api("PUT", "/meters/1", body, headers=headers)
+    assert retry["headers"]["etag"] == first["headers"]["etag"]
+    meter = json.loads(call_api("GET", "/meters/1")["body"])
+    assert meter["annual_quantity"] == 5
+    assert meter["version"] == 3
+    assert count_changes() == changes
+
+
+def test_key_reused_for_another_request(fresh_db, call_api):
+    headers = idempotency_key("key-1")
+    call_api("POST", "/meters", generate_meter_body(1), headers=headers)
+
+    resp = call_api("POST", "/meters", generate_meter_body(2), headers=headers)
+    assert resp["statusCode"] == 422
+    resp = call_api("PUT", "/meters/1", generate_meter_body(1), headers=headers)
+    assert resp["statusCode"] == 422
+
+    assert call_api("GET", "/meters/2")["statusCode"] == 404
+
+
+def test_replay_from_database(fresh_db, call_api):
+    body = generate_meter_body(1)
+    headers = idempotency_key("key-1")
+    first = call_api("POST", "/meters", body, headers=headers)
+
+    # As seen by another container
+    idempotency.response_cache.clear()
+    retry = call_api("POST", "/meters", body, headers=headers)
+    assert retry["statusCode"] == 201
+    assert retry["body"] == first["body"]
+
+
+def reserve(key: str, body: str) -> None:
+    """Reserve the key as an attempt of `POST /meters` still running would."""
+    event = generate_api_gateway_proxy_event_v2("POST", "/meters", body=body)
+    assert idempotency.reserve_key(key, idempotency.request_fingerprint(event))
+
+
+def test_attempt_while_in_progress(fresh_db, call_api):
+    body = generate_meter_body(1)
+    headers = idempotency_key("key-1")
+    reserve("key-1", body)
+
+    # The request is not run a second time
+    resp = call_api("POST", "/meters", body, headers=headers)
+    assert resp["statusCode"] == 409
+    assert resp["headers"]["retry-after"] == "1"
+    assert call_api("GET", "/meters/1")["statusCode"] == 404
+
+    # Nor is another request with the same key
+    resp = call_api("POST", "/meters", generate_meter_body(2), headers=headers)
+    assert resp["statusCode"] == 422
+
+    # The reservation of an attempt that never completed lapses
+    expire("key-1")
+    assert call_api("POST", "/meters", body, headers=headers)["statusCode"] == 201
+
+
+def test_server_error_releases_key(fresh_db, call_api):
+    body = generate_meter_body(1)
+    headers = idempotency_key("key-1")
+
+    with patch("metr.api.record_changes", side_effect=RuntimeError("Failed")):
+        resp = call_api("POST", "/meters", body, headers=headers)
+    assert resp["statusCode"] == 500
+
+    assert call_api("POST", "/meters", body, headers=headers)["statusCode"] == 201
+
+
+def expire(key: str) -> None:
+    with database.Session.begin() as session:
+        session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key)
+            .values(expires_at=time.time() - 1)
+        )
+
+
+def test_expired_key(fresh_db, call_api):
+    call_api(
+        "POST", "/meters", generate_meter_body(1), headers=idempotency_key("key-1")
+    )
+    call_api(
+        "POST", "/meters", generate_meter_body(2), headers=idempotency_key("key-2")
+    )
+    idempotency.response_cache.clear()
+    expire("key-1")
+    expire("key-2")
+
+    # The expired key is reused, and its response replaced
+    headers = idempotency_key("key-1")
+    resp = call_api("POST", "/meters", generate_meter_body(3), headers=headers)
+    assert resp["statusCode"] == 201
+
+    # Other expired keys are purged along the way
+    with database.Session() as session:
+        keys = session.execute(select(IdempotencyKey.key)).scalars().all()
+    assert keys == ["key-1"]
+
+    expire("key-1")
+    assert idempotency.purge_expired() == 1
+
+
+def test_invalid_request_replay(fresh_db, call_api):
+    headers = idempotency_key("key-1")
+
+    # Client errors are kept, the request would fail the same way again
+    assert call_api("POST", "/meters", "{", headers=headers)["statusCode"] == 400
+    retry = call_api("POST", "/meters", "{", headers=headers)
+    assert retry["statusCode"] == 400
+    assert retry["headers"]["idempotent-replayed"] == "true"
+
+
+def test_key_too_long(fresh_db, call_api):
+    headers = idempotency_key("k" * 256)
+    resp = call_api("POST", "/meters", generate_meter_body(1), headers=headers)
+    assert resp["statusCode"] == 400
+    assert call_api("GET", "/meters/1")["statusCode"] == 404
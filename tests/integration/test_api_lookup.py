@@ -0,0 +1,61 @@
+import json
+
+from metr import api
+from tests.factories import generate_api_gateway_proxy_event_v2
+
+
+def test_get_meters_by_ids(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="meter_id=5,1,999,5&fields=meter_id,enabled"
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 200
+    body = json.loads(resp["body"])
+    assert body["meters"] == [
+        {"meter_id": meter.meter_id, "enabled": meter.enabled}
+        for meter in (db_meters[1], db_meters[5])
+    ]
+    assert body["missing"] == {"meter_ids": [999], "external_references": []}
+
+
+def test_get_meters_by_invalid_ids(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="meter_id=1,two"
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 400
+
+
+def test_lookup_meters(db_meters, lambda_context, monkeypatch):
+    monkeypatch.setattr(api, "IN_CHUNK_SIZE", 2)
+    event = generate_api_gateway_proxy_event_v2(
+        "POST",
+        "/meters:lookup",
+        body=json.dumps(
+            {
+                "meter_ids": [0, 1, 2, 1000],
+                "external_references": [db_meters[2].external_reference, "UNKNOWN"],
+            }
+        ),
+    )
+    resp = api.lookup_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 200
+    body = json.loads(resp["body"])
+    assert [meter["meter_id"] for meter in body["meters"]] == [0, 1, 2]
+    assert body["missing"] == {
+        "meter_ids": [1000],
+        "external_references": ["UNKNOWN"],
+    }
+
+
+def test_lookup_meters_too_many(fresh_db, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "POST", "/meters:lookup", body=json.dumps({"meter_ids": list(range(1001))})
+    )
+    resp = api.lookup_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 400
+    assert json.loads(resp["body"]).get("error") == "Validation error"
@@ -0,0 +1,32 @@
+import json
+
+from sqlalchemy import insert
+
+from metr import api, database
+from metr.models import Meter, MeterInput
+from tests.factories import generate_api_gateway_proxy_event_v2, generate_meter_body
+
+
+def test_reads_from_replica(unconfigured_database, tmp_path, lambda_context):
+    primary, replica = (f"sqlite:///{tmp_path / name}.db" for name in ("p", "r"))
+    engine = database.configure_database(primary, replica_urls=[replica])
+    [replica_engine] = database._replica_engines
+    for bind in (engine, replica_engine):
+        database.Base.metadata.create_all(bind=bind)
+
+    # Writes go to the primary only, until replicated
+    body = generate_meter_body(1)
+    event = generate_api_gateway_proxy_event_v2("POST", "/meters", body=body)
+    assert api.handler(event, lambda_context)["statusCode"] == 201
+
+    event = generate_api_gateway_proxy_event_v2("GET", "/meters/1")
+    assert api.handler(event, lambda_context)["statusCode"] == 404
+
+    with replica_engine.begin() as connection:
+        row = MeterInput.model_validate_json(body).to_row()
+        connection.execute(insert(Meter).values(row))
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="count=none"
+    )
+    resp = api.handler(event, lambda_context)
+    assert [meter["meter_id"] for meter in json.loads(resp["body"])["meters"]] == [1]
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from metr import api
+from tests.factories import generate_api_gateway_proxy_event_v2
+
+
+@pytest.mark.parametrize(
+    "path, route, path_params",
+    [
+        ("/meters", "/meters", {}),
+        ("/meters/", "/meters", {}),
+        ("/meters:lookup", "/meters:lookup", {}),
+        ("/meters/42", "/meters/{meter_id}", {"meter_id": "42"}),
+        ("/meters/A%2FB", "/meters/{meter_id}", {"meter_id": "A/B"}),
+    ],
+)
+def test_match_route(path, route, path_params):
+    assert api.match_route(path) == (api.ROUTES[route], path_params)
+
+
+@pytest.mark.parametrize("path", ["/", "/meter", "/meters/1/2", "/meters//"])
+def test_match_route_unknown(path):
+    assert api.match_route(path) is None
+
+
+def test_handler_dispatch(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2("GET", "/meters/3")
+    resp = api.handler(event, lambda_context)
+
+    assert resp["statusCode"] == 200
+    assert json.loads(resp["body"])["meter_id"] == 3
+
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="limit=2"
+    )
+    resp = api.handler(event, lambda_context)
+
+    assert resp["statusCode"] == 200
+    assert len(json.loads(resp["body"])["meters"]) == 2
+
+
+def test_handler_write(fresh_db, lambda_context):
+    body = {
+        "meter_id": 1,
+        "external_reference": "REF1",
+        "supply_start_date": "2024-01-01",
+        "supply_end_date": None,
+        "enabled": True,
+        "annual_quantity": 100.0,
+    }
+    event = generate_api_gateway_proxy_event_v2(
+        "POST", "/meters", body=json.dumps(body)
+    )
+    assert api.handler(event, lambda_context)["statusCode"] == 201
+
+    event = generate_api_gateway_proxy_event_v2(
+        "PATCH", "/meters/1", body=json.dumps({"enabled": False})
+    )
+    assert api.handler(event, lambda_context)["statusCode"] == 200
+
+    event = generate_api_gateway_proxy_event_v2("DELETE", "/meters/1")
+    assert api.handler(event, lambda_context)["statusCode"] == 200
+
+
+def test_handler_not_found(fresh_db, lambda_context):
+    event = generate_api_gateway_proxy_event_v2("GET", "/unknown")
+    resp = api.handler(event, lambda_context)
+
+    assert resp["statusCode"] == 404
+    assert json.loads(resp["body"]) == {"error": "Not found"}
+
+
+def test_handler_method_not_allowed(fresh_db, lambda_context):
+    event = generate_api_gateway_proxy_event_v2("DELETE", "/meters")
+    resp = api.handler(event, lambda_context)
+
+    assert resp["statusCode"] == 405
+    assert resp["headers"]["allow"] == "GET, POST"
@@ -1,6 +1,10 @@
+import base64
+import gzip
 import json
 
-from metr import api
+import sqlalchemy
+
+from metr import api, database, responses
 from tests.factories import generate_api_gateway_proxy_event_v2
 
 
@@ -280,3 +284,320 @@ def test_zpatch_meter_not_found(lambda_context):
         json.loads(resp["body"]).get("message")
         == f"Could not find the meter with ID: {meter_id}"
     )
+
+
+def test_get_meters_cursor_pagination_walks_all_pages(db_meters, lambda_context):
+    seen = []
+    query_string = "limit=30"
+    while query_string is not None:
+        event = generate_api_gateway_proxy_event_v2(
+            "GET", "/meters", query_string=query_string
+        )
+        resp = api.get_meters(event, lambda_context)
+
+        assert resp["statusCode"] == 200
+        body = json.loads(resp["body"])
+        seen.extend(meter["meter_id"] for meter in body["meters"])
+        next_link = body["next_link"]
+        query_string = next_link.split("?", 1)[1] if next_link else None
+
+    assert seen == sorted(meter.meter_id for meter in db_meters)
+
+
+def test_get_meters_cursor_pagination_keeps_filters(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="enabled=true&limit=5"
+    )
+    body = json.loads(api.get_meters(event, lambda_context)["body"])
+    query_string = body["next_link"].split("?", 1)[1]
+
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string=query_string
+    )
+    body = json.loads(api.get_meters(event, lambda_context)["body"])
+
+    assert "enabled=true" in query_string
+    assert len(body["meters"]) == 5
+    assert all(meter["enabled"] is True for meter in body["meters"])
+
+
+def test_get_meters_count_none(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="count=none&limit=10"
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 200
+    body = json.loads(resp["body"])
+    assert body["total_count"] is None
+    assert len(body["meters"]) == 10
+    assert "count=" not in body["next_link"]
+
+
+def test_get_meters_count_estimate_follows_writes(db_meters, lambda_context):
+    def total_count(mode):
+        event = generate_api_gateway_proxy_event_v2(
+            "GET", "/meters", query_string=f"count={mode}"
+        )
+        return json.loads(api.get_meters(event, lambda_context)["body"])["total_count"]
+
+    assert total_count("estimate") == 100
+
+    event = generate_api_gateway_proxy_event_v2(
+        "DELETE", "/meters/0", {"meter_id": "0"}
+    )
+    assert api.delete_meter(event, lambda_context)["statusCode"] == 200
+
+    assert total_count("estimate") == 99
+    assert total_count("exact") == 99
+
+
+def test_post_meters_batch(db_meters, lambda_context):
+    meter = {
+        "external_reference": "BATCH",
+        "supply_start_date": "2021-01-01",
+        "supply_end_date": "2022-01-01",
+        "enabled": True,
+        "annual_quantity": 123.45,
+    }
+    items = [
+        {**meter, "meter_id": 1000, "external_reference": "BATCH-1"},
+        {**meter, "meter_id": 1001, "external_reference": "BATCH-2"},
+        {**meter, "meter_id": 1000, "external_reference": "BATCH-3"},
+        {**meter, "meter_id": db_meters[0].meter_id, "external_reference": "BATCH-4"},
+        {**meter, "meter_id": 1002, "external_reference": "BATCH-1"},
+        {**meter, "meter_id": 1003, "enabled": 100},
+    ]
+    event = generate_api_gateway_proxy_event_v2(
+        "POST", "/meters", body=json.dumps(items)
+    )
+    resp = api.post_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 207
+    body = json.loads(resp["body"])
+    assert body["created"] == 2
+    assert body["failed"] == 4
+    assert [result["status"] for result in body["results"]] == [
+        201,
+        201,
+        409,
+        409,
+        409,
+        400,
+    ]
+    assert body["results"][2]["error"] == "Duplicate meter ID"
+    assert body["results"][4]["error"] == "Duplicate external reference"
+
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters/1001", {"meter_id": "1001"}
+    )
+    resp = api.get_meter(event, lambda_context)
+    assert json.loads(resp["body"])["supply_end_date"] == "2022-01-01T00:00:00"
+
+
+def test_get_meter_cached_until_updated(db_meters, lambda_context):
+    meter_id = db_meters[0].meter_id
+    get_event = generate_api_gateway_proxy_event_v2(
+        "GET", f"/meters/{meter_id}", {"meter_id": str(meter_id)}
+    )
+    hits = api.meter_cache.stats()["hits"]
+
+    first = api.get_meter(get_event, lambda_context)
+    second = api.get_meter(get_event, lambda_context)
+
+    assert first["body"] == second["body"]
+    assert api.meter_cache.stats()["hits"] == hits + 1
+
+    patch_event = generate_api_gateway_proxy_event_v2(
+        "PATCH",
+        f"/meters/{meter_id}",
+        {"meter_id": str(meter_id)},
+        body=json.dumps({"external_reference": "456ABC"}),
+    )
+    assert api.patch_meter(patch_event, lambda_context)["statusCode"] == 200
+
+    resp = api.get_meter(get_event, lambda_context)
+    assert json.loads(resp["body"])["external_reference"] == "456ABC"
+
+
+def test_get_meter_conditional_get(db_meters, lambda_context):
+    meter_id = db_meters[0].meter_id
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", f"/meters/{meter_id}", {"meter_id": str(meter_id)}
+    )
+    etag = api.get_meter(event, lambda_context)["headers"]["etag"]
+
+    event = generate_api_gateway_proxy_event_v2(
+        "GET",
+        f"/meters/{meter_id}",
+        {"meter_id": str(meter_id)},
+        headers={"if-none-match": f'W/"other", {etag}'},
+    )
+    resp = api.get_meter(event, lambda_context)
+
+    assert resp["statusCode"] == 304
+    assert resp["headers"]["etag"] == etag
+    assert resp["body"] == ""
+
+
+def test_get_meters_conditional_get(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2("GET", "/meters")
+    etag = api.get_meters(event, lambda_context)["headers"]["etag"]
+
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", headers={"if-none-match": etag}
+    )
+    assert api.get_meters(event, lambda_context)["statusCode"] == 304
+
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="limit=5", headers={"if-none-match": etag}
+    )
+    assert api.get_meters(event, lambda_context)["statusCode"] == 200
+
+
+def test_get_meters_conditional_get_compressed(db_meters, lambda_context, monkeypatch):
+    monkeypatch.setattr(responses, "COMPRESSION_MIN_SIZE", 0)
+    headers = {"accept-encoding": "gzip"}
+    event = generate_api_gateway_proxy_event_v2("GET", "/meters", headers=headers)
+    etag = api.get_meters(event, lambda_context)["headers"]["etag"]
+    assert etag.endswith('-gzip"')
+
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", headers={**headers, "if-none-match": etag}
+    )
+    resp = api.get_meters(event, lambda_context)
+    assert resp["statusCode"] == 304
+    assert resp["headers"]["etag"] == etag
+
+
+def test_get_meters_body_matches_orm_serialization(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="limit=1000"
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    expected = {
+        "total_count": len(db_meters),
+        "limit": 1000,
+        "cursor": None,
+        "meters": [
+            meter.to_dict()
+            for meter in sorted(
+                api.Session().query(api.Meter).all(), key=lambda m: m.meter_id
+            )
+        ],
+        "next_link": None,
+    }
+    assert resp["body"] == json.dumps(expected)
+
+
+def test_get_meters_compressed(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET",
+        "/meters",
+        query_string="limit=100",
+        headers={"accept-encoding": "gzip"},
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 200
+    assert resp["headers"]["content-encoding"] == "gzip"
+    body = json.loads(gzip.decompress(base64.b64decode(resp["body"])))
+    assert len(body["meters"]) == 100
+
+
+def test_put_meter_single_statement(db_meters, lambda_context):
+    meter_id = db_meters[0].meter_id
+    event = generate_api_gateway_proxy_event_v2(
+        "PUT",
+        f"/meters/{meter_id}",
+        body=json.dumps(
+            {
+                "meter_id": meter_id,
+                "external_reference": "123XYZ",
+                "supply_start_date": "2021-01-01",
+                "supply_end_date": "2022-01-01",
+                "enabled": False,
+                "annual_quantity": 1.5,
+            }
+        ),
+    )
+    statements = []
+    engine = database.Session.kw["bind"]
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sqlalchemy.event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        resp = api.put_meter(event, lambda_context)
+    finally:
+        sqlalchemy.event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    # The meter is only touched by the UPDATE, the other statements record the
+    # change in the change feed
+    meter_statements = [
+        statement for statement in statements if "meter_change" not in statement
+    ]
+    assert resp["statusCode"] == 200
+    assert len(meter_statements) == 1
+    assert meter_statements[0].startswith("UPDATE")
+
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", f"/meters/{meter_id}", {"meter_id": str(meter_id)}
+    )
+    body = json.loads(api.get_meter(event, lambda_context)["body"])
+    assert body["supply_end_date"] == "2022-01-01T00:00:00"
+    assert body["annual_quantity"] == 1.5
+
+
+def test_patch_meter_empty_body(db_meters, lambda_context):
+    meter_id = db_meters[0].meter_id
+    event = generate_api_gateway_proxy_event_v2(
+        "PATCH", f"/meters/{meter_id}", {"meter_id": str(meter_id)}, body="{}"
+    )
+    resp = api.patch_meter(event, lambda_context)
+
+    assert resp["statusCode"] == 200
+
+
+def test_get_meters_sparse_fields(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="fields=enabled,external_reference&limit=5"
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 200
+    body = json.loads(resp["body"])
+    assert [meter["external_reference"] for meter in body["meters"]] == [
+        meter.external_reference for meter in db_meters[:5]
+    ]
+    assert all(
+        list(meter) == ["external_reference", "enabled"] for meter in body["meters"]
+    )
+
+    query_string = body["next_link"].split("?", 1)[1]
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string=query_string
+    )
+    body = json.loads(api.get_meters(event, lambda_context)["body"])
+    assert [meter["external_reference"] for meter in body["meters"]] == [
+        meter.external_reference for meter in db_meters[5:10]
+    ]
+
+
+def test_get_meter_sparse_fields(db_meters, lambda_context):
+    meter_id = db_meters[0].meter_id
+    event = generate_api_gateway_proxy_event_v2(
+        "GET",
+        f"/meters/{meter_id}",
+        {"meter_id": str(meter_id)},
+        query_string="fields=meter_id,annual_quantity",
+    )
+    resp = api.get_meter(event, lambda_context)
+
+    assert resp["statusCode"] == 200
+    assert json.loads(resp["body"]) == {
+        "meter_id": meter_id,
+        "annual_quantity": db_meters[0].annual_quantity,
+    }
@@ -3,7 +3,7 @@ import json
 import pytest
 
 from metr import api
-from tests.factories import generate_api_gateway_proxy_event_v2
+from tests.factories import generate_api_gateway_proxy_event_v2, generate_meter_body
 
 
 @pytest.mark.parametrize(
@@ -13,6 +13,7 @@ from tests.factories import generate_api_gateway_proxy_event_v2
         {"enabled": 100},
         {"supply_start_date": "StringABC"},
         {"annual_quantity": "NaN"},
+        {"annual_quantity": 0},
     ],
 )
 def test_post_meter_invalid_body(body_change, fresh_db, lambda_context):
@@ -116,6 +117,22 @@ def test_post_meter_invalid_JSON_Input(lambda_context):
     assert json.loads(resp["body"]).get("error") == "Invalid JSON format"
 
 
+@pytest.mark.parametrize(
+    "body, error",
+    [
+        ('{"meter_id": 1,', "Invalid JSON format"),
+        ("[{", "Invalid JSON format"),
+        ("42", "Validation error"),
+    ],
+)
+def test_post_meter_malformed_body(body, error, fresh_db, lambda_context):
+    event = generate_api_gateway_proxy_event_v2("POST", "/meters", body=body)
+    resp = api.post_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 400
+    assert json.loads(resp["body"]).get("error") == error
+
+
 def test_put_meter_invalid_JSON_Input(db_meters, lambda_context):
     meter_id = db_meters[0].meter_id
     event = generate_api_gateway_proxy_event_v2(
@@ -142,3 +159,115 @@ def test_patch_meter_invalid_JSON_Input(db_meters, lambda_context):
     assert resp["statusCode"] == 400
     assert "application/json" in resp["headers"]["content-type"]
     assert json.loads(resp["body"])
+
+
+def test_get_meters_invalid_cursor(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="cursor=not-a-cursor"
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 400
+    assert "application/json" in resp["headers"]["content-type"]
+    assert json.loads(resp["body"]).get("error") == "Invalid cursor: not-a-cursor"
+
+
+@pytest.mark.parametrize("limit", ["0", "-1"])
+def test_get_meters_invalid_limit(limit, db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string=f"limit={limit}"
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 400
+    assert json.loads(resp["body"]).get("error") == f"Invalid limit: {limit}"
+
+
+def test_get_meters_invalid_count_mode(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="count=maybe"
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 400
+    assert json.loads(resp["body"]).get("error") == "Invalid count mode: maybe"
+
+
+def test_post_meters_batch_too_large(fresh_db, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "POST", "/meters", body=json.dumps([{}] * (api.MAX_BATCH_SIZE + 1))
+    )
+    resp = api.post_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 400
+    assert "application/json" in resp["headers"]["content-type"]
+
+
+def test_post_meters_batch_invalid_quantity(fresh_db, lambda_context):
+    body = f"[{generate_meter_body(1)}, {generate_meter_body(2, annual_quantity=0)}]"
+    event = generate_api_gateway_proxy_event_v2("POST", "/meters", body=body)
+    resp = api.post_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 207
+    results = json.loads(resp["body"])["results"]
+    assert results[0] == {"index": 0, "status": 201, "meter_id": 1}
+    assert results[1]["status"] == 400
+    assert results[1]["details"][0]["ctx"] == {"gt": "0"}
+
+
+def test_put_meter_duplicate_ref(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "PUT",
+        f"/meters/{db_meters[0].meter_id}",
+        body=json.dumps(
+            {
+                "meter_id": db_meters[0].meter_id,
+                "external_reference": db_meters[1].external_reference,
+                "supply_start_date": "2021-01-01",
+                "supply_end_date": None,
+                "enabled": True,
+                "annual_quantity": 123.45,
+            }
+        ),
+    )
+    resp = api.put_meter(event, lambda_context)
+
+    assert resp["statusCode"] == 409
+    assert json.loads(resp["body"]).get("error") == "Duplicate external reference"
+
+
+def test_patch_meter_duplicate_ref(db_meters, lambda_context):
+    meter_id = db_meters[0].meter_id
+    event = generate_api_gateway_proxy_event_v2(
+        "PATCH",
+        f"/meters/{meter_id}",
+        {"meter_id": str(meter_id)},
+        body=json.dumps({"external_reference": db_meters[1].external_reference}),
+    )
+    resp = api.patch_meter(event, lambda_context)
+
+    assert resp["statusCode"] == 409
+    assert json.loads(resp["body"]).get("error") == "Duplicate external reference"
+
+
+def test_get_meters_invalid_fields(db_meters, lambda_context):
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="fields=meter_id,password"
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 400
+    assert json.loads(resp["body"]).get("error") == "Invalid fields: password"
+
+
+def test_get_meter_invalid_fields(db_meters, lambda_context):
+    meter_id = db_meters[0].meter_id
+    event = generate_api_gateway_proxy_event_v2(
+        "GET",
+        f"/meters/{meter_id}",
+        {"meter_id": str(meter_id)},
+        query_string="fields=password",
+    )
+    resp = api.get_meter(event, lambda_context)
+
+    assert resp["statusCode"] == 400
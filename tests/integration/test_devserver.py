@@ -0,0 +1,66 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from metr.devserver import LambdaRequestHandler, PooledHTTPServer, build_event, main
+from tests.factories import generate_api_gateway_proxy_event_v2
+
+
+def test_build_event():
+    event = build_event(
+        "GET",
+        "/meters?limit=5&enabled=true",
+        {"Accept-Encoding": "gzip", "Host": "localhost:8000"},
+    )
+    expected = generate_api_gateway_proxy_event_v2(
+        "GET",
+        "/meters",
+        query_string="limit=5&enabled=true",
+        headers={"accept-encoding": "gzip", "host": "localhost:8000"},
+    )
+
+    assert event.keys() == expected.keys()
+    for key in ("rawPath", "rawQueryString", "headers", "queryStringParameters"):
+        assert event[key] == expected[key]
+    assert event["requestContext"]["http"]["method"] == "GET"
+
+
+@pytest.fixture()
+def server():
+    server = PooledHTTPServer(("127.0.0.1", 0), LambdaRequestHandler, workers=2)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_server_dispatch(server):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+
+    # Both requests go through the same kept-alive connection
+    connection.request("GET", "/unknown")
+    response = connection.getresponse()
+    assert response.status == 404
+    assert response.getheader("content-type") == "application/json"
+    assert json.loads(response.read()) == {"error": "Not found"}
+
+    connection.request("DELETE", "/meters")
+    response = connection.getresponse()
+    assert response.status == 405
+    assert response.getheader("allow") == "GET, POST"
+    response.read()
+
+    connection.close()
+
+
+@pytest.mark.parametrize("argv", [["--database-url", "sqlite://"], []])
+def test_refuses_memory_database(argv, monkeypatch, capsys):
+    monkeypatch.delenv("METR_DATABASE_URL", raising=False)
+
+    with pytest.raises(SystemExit):
+        main(argv)
+    assert "in-memory database" in capsys.readouterr().err
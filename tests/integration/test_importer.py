@@ -0,0 +1,114 @@
+import io
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from metr import api, importer
+from tests.factories import generate_meter_body
+
+
+def test_import_meters_ndjson_upserts_and_rejects(db_meters):
+    records = [
+        generate_meter_body(1000),
+        generate_meter_body(
+            db_meters[0].meter_id, external_reference="UPDATED-0", enabled=False
+        ),
+        generate_meter_body(1001, external_reference=db_meters[1].external_reference),
+        generate_meter_body(1002, annual_quantity=-1),
+    ]
+    stream = io.StringIO("\n".join(records) + "\n{not json\n")
+    errors = io.StringIO()
+
+    stats = importer.import_meters(stream, errors=errors, batch_size=2)
+
+    assert stats["read"] == 5
+    assert stats["inserted"] == 1
+    assert stats["updated"] == 1
+    assert stats["rejected"] == 3
+    rejected = [json.loads(line) for line in errors.getvalue().splitlines()]
+    assert sorted(error["line"] for error in rejected) == [3, 4, 5]
+
+    exported = io.StringIO()
+    api.export_meters(exported)
+    meters = {
+        meter["meter_id"]: meter
+        for meter in map(json.loads, exported.getvalue().splitlines())
+    }
+    assert len(meters) == len(db_meters) + 1
+    assert meters[db_meters[0].meter_id]["external_reference"] == "UPDATED-0"
+    assert meters[db_meters[0].meter_id]["enabled"] is False
+
+
+def test_import_meters_csv_skip_existing(db_meters):
+    stream = io.StringIO(
+        "meter_id,external_reference,supply_start_date,supply_end_date,enabled,"
+        "annual_quantity\n"
+        f"{db_meters[0].meter_id},SKIPPED,2021-01-01,,true,1.5\n"
+        "1000,NEW-1,2021-01-01T00:00:00,,false,2.5\n"
+    )
+
+    stats = importer.import_meters(stream, fmt="csv", on_conflict="skip")
+
+    assert stats["inserted"] == 1
+    assert stats["skipped"] == 1
+    assert stats["rejected"] == 0
+
+
+def test_import_round_trips_export(db_meters):
+    exported = io.StringIO()
+    api.export_meters(exported, fmt="csv")
+    exported.seek(0)
+
+    stats = importer.import_meters(exported, fmt="csv")
+
+    assert stats["updated"] == len(db_meters)
+    assert stats["rejected"] == 0
+
+
+def test_import_meters_rejects_superseded_rows(fresh_db):
+    records = [
+        generate_meter_body(1000),
+        generate_meter_body(1000, enabled=False),
+        generate_meter_body(1001),
+        generate_meter_body(1000, annual_quantity=5),
+    ]
+    stream = io.StringIO("".join(record + "\n" for record in records))
+    errors = io.StringIO()
+
+    stats = importer.import_meters(stream, errors=errors)
+
+    # Every row read is accounted for
+    assert stats["read"] == 4
+    assert stats["inserted"] == 2
+    assert stats["rejected"] == 2
+    rejected = [json.loads(line) for line in errors.getvalue().splitlines()]
+    assert [(error["line"], error["errors"]) for error in rejected] == [
+        (1, "Superseded by line 2"),
+        (2, "Superseded by line 4"),
+    ]
+    assert rejected[1]["record"] == json.loads(records[1])
+
+
+def test_import_meters_rejects_original_record(db_meters):
+    record = generate_meter_body(
+        1000, external_reference=db_meters[0].external_reference, enabled="yes"
+    )
+    errors = io.StringIO()
+
+    importer.import_meters(io.StringIO(record + "\n"), errors=errors)
+
+    # The record as it was read, not as converted for the database
+    rejected = json.loads(errors.getvalue())
+    assert rejected["errors"] == "Duplicate external reference"
+    assert rejected["record"] == json.loads(record)
+
+
+def test_import_meters_unsupported_database():
+    session = MagicMock()
+    session.get_bind.return_value.dialect.name = "mysql"
+
+    with patch("metr.importer.Session", return_value=session):
+        with pytest.raises(ValueError, match="not supported on mysql"):
+            importer.import_meters(io.StringIO(""))
+    session.close.assert_called_once()
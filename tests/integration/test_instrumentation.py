@@ -0,0 +1,85 @@
+import json
+import logging
+
+from metr import api, database, instrumentation
+from tests.factories import generate_api_gateway_proxy_event_v2
+
+
+def request_logs(caplog) -> list[dict]:
+    return [
+        json.loads(record.getMessage())
+        for record in caplog.records
+        if record.name == "metr.requests" and record.levelno == logging.INFO
+    ]
+
+
+def test_request_log(db_meters, lambda_context, caplog):
+    caplog.set_level(logging.INFO, logger="metr.requests")
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters", query_string="limit=5&enabled=true"
+    )
+    resp = api.get_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 200
+    [log] = request_logs(caplog)
+    assert log["handler"] == "get_meters"
+    assert log["method"] == "GET"
+    assert log["path"] == "/meters"
+    assert log["status"] == 200
+    # The count and the page queries
+    assert log["sql_count"] == 2
+    assert set(log["phases_ms"]) == {"db", "validation", "serialization"}
+    assert log["duration_ms"] > 0
+
+
+def test_request_log_error(fresh_db, lambda_context, caplog):
+    caplog.set_level(logging.INFO, logger="metr.requests")
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters/1", path_params={"meter_id": "1"}
+    )
+    resp = api.get_meter(event, lambda_context)
+
+    assert resp["statusCode"] == 404
+    [log] = request_logs(caplog)
+    assert log["handler"] == "get_meter"
+    assert log["status"] == 404
+    assert log["sql_count"] == 1
+
+
+def test_slow_query_plan(db_meters, lambda_context, caplog, monkeypatch):
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 0)
+    caplog.set_level(logging.WARNING, logger="metr.requests")
+    event = generate_api_gateway_proxy_event_v2(
+        "GET", "/meters/1", path_params={"meter_id": "1"}
+    )
+    resp = api.get_meter(event, lambda_context)
+
+    assert resp["statusCode"] == 200
+    [slow_query] = [
+        json.loads(record.getMessage())
+        for record in caplog.records
+        if record.levelno == logging.WARNING
+    ]
+    assert slow_query["statement"].startswith("SELECT")
+    assert any("USING INTEGER PRIMARY KEY" in line for line in slow_query["plan"])
+
+
+def test_failed_statement(db_meters, lambda_context, caplog):
+    caplog.set_level(logging.INFO, logger="metr.requests")
+    meter = db_meters[0].to_dict()
+    body = {
+        **meter,
+        "supply_start_date": meter["supply_start_date"][:10],
+        "supply_end_date": None,
+    }
+    event = generate_api_gateway_proxy_event_v2(
+        "POST", "/meters", body=json.dumps(body)
+    )
+    resp = api.post_meters(event, lambda_context)
+
+    assert resp["statusCode"] == 409
+    [log] = request_logs(caplog)
+    # The failed INSERT is counted, and its start time not left on the connection
+    assert log["sql_count"] == 1
+    with database.init_database().connect() as connection:
+        assert connection.info.get("metr_query_started") == []
@@ -0,0 +1,24 @@
+import logging
+
+from benchmarks.startup import measure_startup
+from metr import api
+
+# Generous bounds, meant to catch an import or first request getting much slower
+# rather than to benchmark the current machine
+MAX_COLD_START_MS = 5_000
+MAX_FIRST_REQUEST_MS = 250
+
+
+def test_cold_start():
+    timings = measure_startup()
+
+    assert timings["import_ms"] + timings["warm_up_ms"] < MAX_COLD_START_MS
+    assert timings["first_request_ms"] < MAX_FIRST_REQUEST_MS
+
+
+def test_warm_up(fresh_db, caplog):
+    caplog.set_level(logging.INFO, logger="metr.api")
+    api.warm_up()
+
+    assert "Warmed up" in caplog.text
+    assert "Could not connect" not in caplog.text
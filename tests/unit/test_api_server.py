@@ -1,7 +1,10 @@
 import json
 from unittest.mock import patch
 
-from metr import api
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from metr import api, database
 from tests.factories import generate_api_gateway_proxy_event_v2
 
 
@@ -108,14 +111,58 @@ def test_patch_meter_exception_handling(db_meters, lambda_context):
         assert json.loads(resp["body"])["error"] == "Server error"
 
 
+@pytest.mark.parametrize(
+    "message, status_code, error",
+    [
+        ("UNIQUE constraint failed: meter.meter_id", 409, "Duplicate meter ID"),
+        (
+            'duplicate key value violates unique constraint "meter_pkey"\n'
+            "DETAIL:  Key (meter_id)=(1) already exists.",
+            409,
+            "Duplicate meter ID",
+        ),
+        (
+            'duplicate key value violates unique constraint "ix_meter_external_'
+            'reference"\nDETAIL:  Key (external_reference)=(X) already exists.',
+            409,
+            "Duplicate external reference",
+        ),
+        ("NOT NULL constraint failed: meter.enabled", 500, None),
+    ],
+)
+def test_integrity_error_response(message, status_code, error):
+    resp = api.integrity_error_response(
+        {}, IntegrityError("INSERT", {}, Exception(message))
+    )
+
+    assert resp["statusCode"] == status_code
+    if error:
+        assert json.loads(resp["body"])["error"] == error
+
+
 # Creating Empty Session and let it fail for exception
 class MySession:
+    def __init__(self, **kwargs):
+        pass
+
     def query(self, model):
         return self
 
     def filter_by(self, **kwargs):
         return self
 
+    def order_by(self, *args):
+        return self
+
+    def execute(self, statement, parameters=None):
+        return self
+
+    def get_bind(self):
+        return database.init_database()
+
+    def scalar_one(self):
+        raise Exception("Server error")
+
     def count(self):
         raise Exception("Server error")
 
@@ -131,6 +178,9 @@ class MySession:
     def all(self):
         raise Exception("Server error")
 
+    def commit(self):
+        raise Exception("Server error")
+
     def rollback(self):
         return
 
@@ -0,0 +1,35 @@
+from benchmarks.suite import compare, percentile
+
+
+def result(rps: float, p50: float, p95: float, p99: float) -> dict:
+    return {"requests": 100, "rps": rps, "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+
+def test_percentile():
+    timings = [float(i) for i in range(1, 101)]
+
+    assert percentile(timings, 50) == 50.0
+    assert percentile(timings, 95) == 95.0
+    assert percentile(timings, 99) == 99.0
+    assert percentile([3.0], 99) == 3.0
+
+
+def test_compare_within_tolerance():
+    baseline = {"10000": {"get": result(1000, 1.0, 2.0, 3.0)}}
+    results = {"10000": {"get": result(900, 1.1, 2.2, 3.3)}}
+
+    assert compare(results, baseline, 0.2) == []
+
+
+def test_compare_regressions():
+    baseline = {"10000": {"get": result(1000, 1.0, 2.0, 3.0)}}
+    results = {
+        "10000": {"get": result(700, 1.0, 3.0, 3.0), "post": result(1, 9, 9, 9)},
+        "100000": {"get": result(1, 9, 9, 9)},
+    }
+
+    # Scenarios missing from the baseline are not compared
+    assert compare(results, baseline, 0.2) == [
+        "get on 10000 meters: 700 requests/sec, baseline 1000",
+        "get on 10000 meters: p95_ms 3.0, baseline 2.0",
+    ]
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from metr.cache import CountCache, LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(ttl=10)
+    with patch("metr.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("metr.cache.time.monotonic", return_value=111.0):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_count_cache_adjust_keeps_unfiltered_count():
+    cache = CountCache()
+    cache.set({}, 10)
+    cache.set({"enabled": True}, 4)
+
+    cache.adjust(+1)
+
+    assert cache.get({}) == 11
+    assert cache.get({"enabled": True}) is None
+
+
+def test_lru_cache_stats():
+    cache = LRUCache(maxsize=1)
+    cache.get("a")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.set("b", 2)
+
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "evictions": 1}
+
+
+def test_lru_cache_shared_between_threads():
+    cache = LRUCache(maxsize=8)
+    count_cache = CountCache()
+    count_cache.set({}, 0)
+
+    def work(worker: int) -> None:
+        for i in range(2000):
+            key = (worker + i) % 16
+            cache.set(key, i)
+            cache.get(key)
+            cache.get((key + 1) % 16)
+            cache.delete((key + 2) % 16)
+            count_cache.adjust(+1)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        # Re-raises the errors of the workers, if any
+        list(executor.map(work, range(8)))
+
+    assert len(cache) <= 8
+    assert count_cache.get({}) == 8 * 2000
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from metr.changes import record_changes
+
+
+class RecordingSession:
+    def __init__(self, dialect_name: str):
+        self.bind = SimpleNamespace(dialect=SimpleNamespace(name=dialect_name))
+        self.statements: list[str] = []
+
+    def get_bind(self):
+        return self.bind
+
+    def execute(self, statement, parameters=None):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+
+
+def test_record_changes_locks_on_postgresql():
+    session = RecordingSession("postgresql")
+
+    record_changes(session, [1, 2], "upsert")
+
+    assert session.statements[0].startswith("SELECT pg_advisory_xact_lock(")
+    assert session.statements[1].startswith("DELETE FROM meter_change")
+    assert session.statements[2].startswith("INSERT INTO meter_change")
+
+
+def test_record_changes_no_lock_on_sqlite():
+    session = RecordingSession("sqlite")
+
+    record_changes(session, [1], "delete")
+    record_changes(session, [], "delete")
+
+    assert len(session.statements) == 2
+    assert not any("pg_advisory" in statement for statement in session.statements)
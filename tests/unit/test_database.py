@@ -0,0 +1,113 @@
+import pytest
+
+from metr import database
+
+
+def test_configure_database_reuses_engine(unconfigured_database, tmp_path):
+    url = f"sqlite:///{tmp_path / 'metr.db'}"
+
+    engine = database.configure_database(url)
+
+    assert database.configure_database(url) is engine
+    assert database.Session.kw["bind"] is engine
+    engine.dispose()
+
+
+def test_configure_database_pool_settings(unconfigured_database, tmp_path, monkeypatch):
+    monkeypatch.setenv("METR_DB_POOL_SIZE", "3")
+    url = f"sqlite:///{tmp_path / 'metr.db'}"
+
+    engine = database.configure_database(url, pool_recycle=60)
+
+    assert engine.pool.size() == 3
+    assert engine.pool._recycle == 60
+    assert engine.pool._pre_ping is True
+    engine.dispose()
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "sqlite:///:memory:"])
+def test_memory_database_not_recycled(unconfigured_database, url):
+    engine = database.configure_database(url)
+
+    assert engine.pool._recycle == -1
+    assert engine.pool._pre_ping is False
+    engine.dispose()
+
+
+def test_session_configures_database_lazily(
+    unconfigured_database, tmp_path, monkeypatch
+):
+    path = tmp_path / "metr.db"
+    monkeypatch.setenv("METR_DATABASE_URL", f"sqlite:///{path}")
+
+    with database.Session() as session:
+        assert session.get_bind().url.database == str(path)
+    database.init_database().dispose()
+
+
+def test_dispose_after_fork(unconfigured_database, tmp_path):
+    engine = database.configure_database(f"sqlite:///{tmp_path / 'metr.db'}")
+    with engine.connect():
+        assert engine.pool.checkedin() == 0
+    assert engine.pool.checkedin() == 1
+
+    database.dispose_after_fork()
+
+    assert database.init_database() is engine
+    assert engine.pool.checkedin() == 0
+    engine.dispose()
+
+
+def sqlite_urls(tmp_path, *names: str) -> list[str]:
+    return [f"sqlite:///{tmp_path / name}.db" for name in names]
+
+
+def test_read_engine_without_replicas(unconfigured_database, tmp_path):
+    [url] = sqlite_urls(tmp_path, "primary")
+    engine = database.configure_database(url, replica_urls=[])
+
+    assert database.read_engine() is engine
+
+
+def test_read_engine_round_robin(unconfigured_database, tmp_path):
+    primary, *replicas = sqlite_urls(tmp_path, "primary", "replica1", "replica2")
+    database.configure_database(primary, replica_urls=replicas)
+
+    urls = [str(database.read_engine().url) for _ in range(4)]
+
+    assert sorted(urls[:2]) == replicas
+    assert urls[2:] == urls[:2]
+
+
+def test_read_engine_least_loaded(unconfigured_database, tmp_path):
+    primary, *replicas = sqlite_urls(tmp_path, "primary", "replica1", "replica2")
+    database.configure_database(
+        primary, replica_urls=replicas, replica_strategy="least_loaded"
+    )
+
+    busy = database.read_engine()
+    with busy.connect():
+        assert all(database.read_engine() is not busy for _ in range(4))
+    assert {database.read_engine(), database.read_engine()} == set(
+        database._replica_engines
+    )
+
+
+def test_read_your_writes(unconfigured_database, tmp_path, monkeypatch):
+    primary, replica = sqlite_urls(tmp_path, "primary", "replica")
+    engine = database.configure_database(
+        primary, replica_urls=[replica], read_your_writes=5
+    )
+    assert database.read_engine() is not engine
+
+    with database.Session() as session:
+        session.commit()
+    assert database.read_engine() is engine
+
+    monkeypatch.setattr(database, "_last_write", database._last_write - 5)
+    assert database.read_engine() is not engine
+
+
+def test_invalid_replica_strategy(unconfigured_database):
+    with pytest.raises(ValueError, match="Invalid replica strategy: random"):
+        database.configure_database(replica_strategy="random")
@@ -0,0 +1,50 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from metr.models import METER_FIELDS, Meter, compile_row_encoder
+
+
+@pytest.mark.parametrize(
+    "meter",
+    [
+        Meter(
+            meter_id=1,
+            external_reference="123XYZ",
+            supply_start_date=datetime(2021, 1, 1),
+            supply_end_date=None,
+            enabled=True,
+            annual_quantity=123.45,
+            version=1,
+        ),
+        Meter(
+            meter_id=2,
+            external_reference='quote" \\ tab\t é',
+            supply_start_date=datetime(2021, 1, 1, 12, 30, 15, 123),
+            supply_end_date=datetime(2022, 12, 31),
+            enabled=False,
+            annual_quantity=1e-7,
+            version=7,
+        ),
+        Meter(
+            meter_id=3,
+            external_reference="",
+            supply_start_date=datetime(2021, 1, 1),
+            supply_end_date=None,
+            enabled=False,
+            annual_quantity=float("inf"),
+            version=2**40,
+        ),
+    ],
+)
+def test_row_encoder_matches_to_dict(meter):
+    row = tuple(getattr(meter, field) for field in METER_FIELDS)
+
+    assert compile_row_encoder()(row) == json.dumps(meter.to_dict())
+
+
+def test_row_encoder_subset_of_fields():
+    encode_row = compile_row_encoder(("meter_id", "enabled"))
+
+    assert encode_row((5, True)) == json.dumps({"meter_id": 5, "enabled": True})
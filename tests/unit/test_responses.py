@@ -0,0 +1,74 @@
+import base64
+import gzip
+import json
+import zlib
+
+import pytest
+
+from metr import responses
+
+
+def _event(accept_encoding=None):
+    headers = {"accept-encoding": accept_encoding} if accept_encoding else {}
+    return {"headers": headers}
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        (None, None),
+        ("gzip, deflate, br", "gzip"),
+        ("deflate", "deflate"),
+        ("gzip;q=0.5, deflate", "deflate"),
+        ("gzip;q=0, identity", None),
+        ("*", "gzip"),
+        ("br", None),
+    ],
+)
+def test_accepted_encoding(accept_encoding, expected):
+    assert responses.accepted_encoding(_event(accept_encoding)) == expected
+
+
+@pytest.mark.parametrize(
+    "encoding, decompress", [("gzip", gzip.decompress), ("deflate", zlib.decompress)]
+)
+def test_build_response_compresses_large_bodies(encoding, decompress):
+    body = json.dumps({"meters": ["x" * 10] * 500})
+
+    resp = responses.build_response(_event(encoding), 200, body)
+
+    assert resp["isBase64Encoded"] is True
+    assert resp["headers"]["content-encoding"] == encoding
+    assert resp["headers"]["vary"] == "accept-encoding"
+    assert decompress(base64.b64decode(resp["body"])).decode() == body
+
+
+def test_build_response_keeps_small_bodies_uncompressed():
+    resp = responses.json_response(_event("gzip"), 200, {"meter_id": 1})
+
+    assert resp["body"] == '{"meter_id": 1}'
+    assert "content-encoding" not in resp["headers"]
+    assert "isBase64Encoded" not in resp
+
+
+def test_build_response_codes_etag():
+    body = json.dumps({"meters": ["x" * 10] * 500})
+
+    resp = responses.build_response(_event("gzip"), 200, body, {"etag": '"abc"'})
+    assert resp["headers"]["etag"] == '"abc-gzip"'
+    assert responses.uncoded_etag(resp["headers"]["etag"]) == '"abc"'
+
+    resp = responses.build_response(_event(), 200, body, {"etag": '"abc"'})
+    assert resp["headers"]["etag"] == '"abc"'
+
+
+def test_not_modified_response_codes_etag():
+    body = json.dumps({"meters": ["x" * 10] * 500})
+
+    resp = responses.not_modified_response(_event("deflate"), '"abc"', body)
+    assert resp["statusCode"] == 304
+    assert resp["headers"]["etag"] == '"abc-deflate"'
+    assert resp["headers"]["vary"] == "accept-encoding"
+
+    resp = responses.not_modified_response(_event("deflate"), '"abc"', "{}")
+    assert resp["headers"]["etag"] == '"abc"'